@@ -6,11 +6,24 @@ from pathlib import Path
 from datetime import datetime, date, timedelta
 import calendar
 import io
+import sys
 import json
+import os
+import hashlib
+import hmac
+import secrets
+import re
+import bisect
+import pickle
+import shutil
+import tempfile
+import threading
 
 import plotly.express as px
 from sklearn.linear_model import LinearRegression
 
+import statement_parsers
+
 # Try Prophet; fallback if not available
 try:
     from prophet import Prophet
@@ -32,6 +45,28 @@ try:
 except Exception:
     GSPREAD_AVAILABLE = False
 
+# Optional: pyarrow for Parquet exports
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except Exception:
+    PYARROW_AVAILABLE = False
+
+# fcntl file locks keep the headless alert batch and the server from writing a ledger at once (POSIX only)
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except Exception:
+    FCNTL_AVAILABLE = False
+
+# openpyxl powers the Excel export (write-only mode keeps memory flat)
+try:
+    from openpyxl import Workbook
+    OPENPYXL_AVAILABLE = True
+except Exception:
+    OPENPYXL_AVAILABLE = False
+
 # Custom CSS for personal, fun, and quirky UI
 def apply_custom_styling():
     st.markdown("""
@@ -271,53 +306,211 @@ def apply_custom_styling():
 # ---------------------
 # File paths & helpers
 # ---------------------
-DATA_DIR = Path("data")
-EXPENSES_FILE = DATA_DIR / "expenses.csv"
-RECURRING_FILE = DATA_DIR / "recurring.csv"
-SETTINGS_FILE = DATA_DIR / "settings.json"
+ROOT_DATA_DIR = Path("data")
+USERS_DIR = ROOT_DATA_DIR / "users"
+DATA_DIR = ROOT_DATA_DIR
+
+def set_data_dir(path):
+    """Point every data file at `path` (a user's directory, data/users/<name>)."""
+    global DATA_DIR, EXPENSES_FILE, RECURRING_FILE, SETTINGS_FILE, LEDGER_DIR, LEDGER_META_FILE
+    global SEARCH_INDEX_FILE, ANOMALY_STATE_FILE, ALERT_STATE_FILE, ALERT_OUTBOX_FILE, SNAPSHOT_FILE, JOURNAL_FILE
+    global BANK_PROFILES_FILE, CUBE_FILE
+    DATA_DIR = Path(path)
+    EXPENSES_FILE = DATA_DIR / "expenses.csv"
+    RECURRING_FILE = DATA_DIR / "recurring.csv"
+    SETTINGS_FILE = DATA_DIR / "settings.json"
+    LEDGER_DIR = DATA_DIR / "ledger"
+    LEDGER_META_FILE = LEDGER_DIR / "meta.json"
+    SEARCH_INDEX_FILE = DATA_DIR / "search_index.pkl"
+    ANOMALY_STATE_FILE = DATA_DIR / "anomaly_stats.json"
+    ALERT_STATE_FILE = DATA_DIR / "alert_state.json"
+    ALERT_OUTBOX_FILE = DATA_DIR / "alerts_outbox.jsonl"
+    SNAPSHOT_FILE = DATA_DIR / "snapshot.pkl"
+    JOURNAL_FILE = DATA_DIR / "journal.jsonl"
+    BANK_PROFILES_FILE = DATA_DIR / "bank_profiles.json"
+    CUBE_FILE = DATA_DIR / "cube.json"
+
+set_data_dir(DATA_DIR)
+
+EXPENSE_COLUMNS = ["Date","Category","Amount","PaymentType","Notes","IsRecurring","CreatedAt"]
+RECURRING_COLUMNS = ["Name","Category","Amount","Frequency","StartDate","DayOfMonth","LastApplied"]
+CATEGORIES = ["Food","Shopping","Rent","Travel","Subscriptions","Utilities","Other"]
+PAYMENT_TYPES = ["Card","UPI","Cash","Recurring"]
 
 def ensure_files():
-    DATA_DIR.mkdir(exist_ok=True)
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
     if not EXPENSES_FILE.exists():
-        df = pd.DataFrame(columns=["Date","Category","Amount","PaymentType","Notes","IsRecurring","CreatedAt"])
+        df = pd.DataFrame(columns=EXPENSE_COLUMNS)
         df.to_csv(EXPENSES_FILE, index=False)
     if not RECURRING_FILE.exists():
-        df = pd.DataFrame(columns=["Name","Category","Amount","Frequency","StartDate","DayOfMonth","LastApplied"])
+        df = pd.DataFrame(columns=RECURRING_COLUMNS)
         df.to_csv(RECURRING_FILE, index=False)
     if not SETTINGS_FILE.exists():
         default = {
             "monthly_budget": None,
             "monthly_income": None,
-            "savings_goal": None
+            "savings_goal": None,
+            "weekly_budget": None,
+            "category_limits": {}
         }
         with open(SETTINGS_FILE, "w") as f:
             json.dump(default, f)
+    recover_ledger()
 
 def load_settings():
     with open(SETTINGS_FILE,"r") as f:
         return json.load(f)
 
+def read_json(path):
+    """Load a JSON state file; None if it's missing or half-written."""
+    if not path.exists():
+        return None
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except ValueError:
+        return None
+
+def write_json_atomic(path, obj):
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w") as f:
+        json.dump(obj, f)
+    os.replace(tmp, path)
+
 def save_settings(settings):
     with open(SETTINGS_FILE,"w") as f:
         json.dump(settings, f)
 
 def load_expenses():
+    """Typed expenses frame, served from the snapshot + journal (see load_expense_frame)."""
+    return load_expense_frame().drop(columns="Id")
+
+def _parse_expenses_csv():
     df = pd.read_csv(EXPENSES_FILE, parse_dates=["Date"], dayfirst=False)
     if df.empty:
         return df
     df["Date"] = pd.to_datetime(df["Date"]).dt.date
     return df
 
-def save_expenses(df):
-    """Overwrite the expenses CSV with the given DataFrame."""
-    df.to_csv(EXPENSES_FILE, index=False)
-
+def _clean_text_fields(df):
+    """Newlines inside fields would break the one-row-per-line layout the ledger offsets rely on."""
+    out = df.reindex(columns=EXPENSE_COLUMNS).copy()
+    for col in ["Category", "PaymentType", "Notes"]:
+        present = out[col].notna()
+        out[col] = out[col].astype(object)
+        out.loc[present, col] = out.loc[present, col].astype(str).str.replace(r"[\r\n]+", " ", regex=True)
+    return out
+
+def _write_expense_lines(df, f, start_offset):
+    """Write df as CSV rows into binary file f and return the byte offset of every row."""
+    if len(df) == 0:
+        return np.empty(0, dtype=np.int64)
+    data = df.to_csv(header=False, index=False).replace("\r\n", "\n").encode("utf-8")
+    f.write(data)
+    ends = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == 10) + 1
+    return np.concatenate([[0], ends[:-1]]).astype(np.int64) + start_offset
+
+def _expenses_tmp_file():
+    return EXPENSES_FILE.with_suffix(".csv.tmp")
+
+class _PathLock:
+    """
+    Re-entrant lock on a data directory (or users.json): an RLock between this process's threads and,
+    where fcntl exists, an flock on <path>.lock between processes (the server and the cron alert batch).
+    """
+    def __init__(self, path):
+        self.path = path
+        self._rlock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def __enter__(self):
+        self._rlock.acquire()
+        try:
+            if self._depth == 0 and FCNTL_AVAILABLE:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                except BaseException:
+                    os.close(fd)
+                    raise
+                self._fd = fd
+        except BaseException:
+            self._rlock.release()
+            raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0 and self._fd is not None:
+            os.close(self._fd)   # closing the descriptor drops the flock
+            self._fd = None
+        self._rlock.release()
+
+@st.cache_resource(show_spinner=False)
+def _ledger_lock(data_dir):
+    return _PathLock(Path(f"{data_dir}.lock"))
+
+def ledger_lock():
+    """Write lock for the current user's ledger only, so one user's big import never blocks another."""
+    return _ledger_lock(str(DATA_DIR.resolve()))
+
+def save_expenses(df, ids=None):
+    """
+    Overwrite the expenses CSV with the given DataFrame.
+    Pass the ledger ids of the rows (after a delete or an inline edit) so expense IDs and the
+    ledger generation stay; the cube and alert totals are then patched for just the rows that
+    changed instead of being rebuilt. Edited text must be re-indexed with patch_search_index.
+    """
+    df = _clean_text_fields(df)
+    header = (",".join(EXPENSE_COLUMNS) + "\n").encode("utf-8")
+    with ledger_lock():
+        before = ledger_copy() if ids is not None else None
+        # a crash mid-write must leave the old file whole, so write aside and swap it in
+        with open(_expenses_tmp_file(), "wb") as f:
+            f.write(header)
+            offsets = _write_expense_lines(df, f, len(header))
+            f.flush()
+            os.fsync(f.fileno())
+        _invalidate_ledger_meta()
+        os.replace(_expenses_tmp_file(), EXPENSES_FILE)
+        rebuild_ledger(df, offsets, ids)
+        if before is not None:
+            update_cube_after_rewrite(*before)
+            update_alert_totals_after_rewrite(*before)
+        else:
+            update_cube()
+        check_alerts()   # edits can push a period over a limit just like appends
+        cols, meta = open_ledger()
+        frame = _typed_expenses(df).reset_index(drop=True)
+        frame.insert(0, "Id", np.asarray(cols["id"]))
+    snapshot_in_background(frame, meta)
+
+def _commit_rows(df):
+    """CSV + ledger + rollups for rows already in the journal. Caller holds the ledger lock."""
+    csv_bytes_before = EXPENSES_FILE.stat().st_size
+    with open(EXPENSES_FILE, "ab") as f:
+        offsets = _write_expense_lines(df, f, csv_bytes_before)
+    ledger_append(df, offsets, csv_bytes_before)
+    anomalies = score_new_expenses(len(df))
+    alerts = update_alert_totals(len(df))
+    update_cube()
+    return {"rows": len(df), "anomalies": anomalies, "alerts": alerts}
+
+def append_expense_rows(df):
+    """Append rows to the expenses CSV and keep the columnar ledger in step."""
+    df = _clean_text_fields(df)
+    with ledger_lock():
+        meta = sync_ledger()
+        journal_append(df, np.arange(meta["next_id"], meta["next_id"] + len(df)), meta["generation"])
+        report = _commit_rows(df)
+    maybe_snapshot()
+    return report
 
 def append_expense(row: dict):
-    df = load_expenses()
-    ndf = pd.DataFrame([row])
-    ndf.to_csv(EXPENSES_FILE, mode='a', header=False, index=False)
-    return
+    return append_expense_rows(pd.DataFrame([row]))
 
 def load_recurring():
     df = pd.read_csv(RECURRING_FILE)
@@ -330,16 +523,28 @@ def save_recurring(df):
     df.to_csv(RECURRING_FILE, index=False)
     
 def delete_expense_by_index(df, index_to_delete):
-    """Delete expense by DataFrame index and save"""
-    df_updated = df.drop(index_to_delete).reset_index(drop=True)
-    df_updated.to_csv(EXPENSES_FILE, index=False)
+    """
+    Delete expense by DataFrame index and save (df must be the full ledger from load_expenses,
+    read under ledger_lock() so no other session's append can land between the read and the rewrite)
+    """
+    with ledger_lock():
+        cols, meta = open_ledger()
+        if len(df) != meta["rows"]:
+            raise ValueError("Expenses changed since they were loaded; reload and try again.")
+        keep_ids = np.delete(np.asarray(cols["id"]), index_to_delete)
+        df_updated = df.drop(index_to_delete).reset_index(drop=True)
+        save_expenses(df_updated, ids=keep_ids)
     return df_updated
 
-def delete_recurring_by_index(df, index_to_delete):
-    """Delete recurring payment by DataFrame index and save"""
-    df_updated = df.drop(index_to_delete).reset_index(drop=True)
-    df_updated.to_csv(RECURRING_FILE, index=False)
-    return df_updated
+def delete_expenses_by_id(ids_to_delete):
+    """Delete expenses by their stable ledger IDs (as returned by search_expenses)."""
+    with ledger_lock():
+        cols, _ = open_ledger()
+        positions = np.flatnonzero(np.isin(cols["id"], np.asarray(ids_to_delete, dtype=np.int64)))
+        if len(positions) == 0:
+            return 0
+        delete_expense_by_index(load_expenses(), positions)
+    return len(positions)
 
 def check_duplicate_expense(expenses_df, date_val, amount_val, category_val):
     """Check if similar expense exists"""
@@ -352,6 +557,1283 @@ def check_duplicate_expense(expenses_df, date_val, amount_val, category_val):
     ]
     return len(similar) > 0
 
+# ---------------------
+# Columnar ledger (memory-mapped)
+# ---------------------
+# Fixed-width binary copy of the numeric side of expenses.csv, one file per column.
+# Row i here is row i of the CSV. Hot aggregations read these through np.memmap
+# instead of parsing the CSV (and its Notes strings) on every rerun.
+# Appends only ever grow the column files. A rebuild writes a fresh ledger/r<revision>/
+# directory and publishes it by replacing meta.json, so another session still mapping
+# the old revision keeps reading intact files (truncating a mapped file is a SIGBUS).
+LEDGER_VERSION = 3
+LEDGER_COLUMNS = {
+    "id": np.int64,         # stable expense ID, ascending with row order, never reused
+    "offset": np.int64,     # byte offset of the row in expenses.csv
+    "date": np.int32,       # date.toordinal(); 0 when the CSV date can't be parsed
+    "amount": np.int64,     # paise
+    "category": np.uint16,  # index into meta["categories"]
+    "payment": np.uint16,   # index into meta["payments"]
+    "flags": np.uint8,      # bit 0 = recurring
+}
+FLAG_RECURRING = 1
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+def _ledger_revision_dir(meta):
+    return LEDGER_DIR / f"r{meta['revision']}"
+
+def _ledger_file(name, meta):
+    return _ledger_revision_dir(meta) / f"{name}.bin"
+
+def _drop_old_ledger_revisions(meta):
+    """Remove column files of earlier revisions; sessions that still map them keep the data until they let go."""
+    keep = _ledger_revision_dir(meta)
+    for path in LEDGER_DIR.iterdir():
+        if path.is_dir() and path.name.startswith("r") and path != keep:
+            shutil.rmtree(path, ignore_errors=True)
+        elif path.suffix == ".bin":   # version 2 kept the columns directly in ledger/
+            path.unlink(missing_ok=True)
+
+def _truthy(series):
+    return series.astype(str).str.strip().str.lower().isin(["true", "1", "yes"])
+
+def load_ledger_meta():
+    return read_json(LEDGER_META_FILE)
+
+def _save_ledger_meta(meta):
+    write_json_atomic(LEDGER_META_FILE, meta)
+
+def _ledger_in_sync(meta, csv_bytes):
+    return meta is not None and meta.get("version") == LEDGER_VERSION and meta.get("csv_bytes") == csv_bytes
+
+def _encode_codes(values, table):
+    """Map labels to integer codes, growing the code table for labels we haven't seen yet."""
+    labels = values.fillna("").astype(str)
+    lookup = {v: i for i, v in enumerate(table)}
+    for v in pd.unique(labels):
+        if v not in lookup:
+            lookup[v] = len(table)
+            table.append(v)
+    return labels.map(lookup).to_numpy(dtype=np.uint16)
+
+def encode_ledger_columns(df, meta):
+    """Turn expense rows into the fixed-width value columns (extends meta's code tables in place)."""
+    dates = pd.to_datetime(df["Date"], errors="coerce")
+    days = dates.to_numpy().astype("datetime64[D]").astype(np.int64) + _EPOCH_ORDINAL
+    days[dates.isna().to_numpy()] = 0
+    amounts = pd.to_numeric(df["Amount"], errors="coerce").fillna(0.0).to_numpy(dtype=float)
+    return {
+        "date": days.astype(np.int32),
+        "amount": np.round(amounts * 100).astype(np.int64),
+        "category": _encode_codes(df["Category"], meta["categories"]),
+        "payment": _encode_codes(df["PaymentType"], meta["payments"]),
+        "flags": np.where(_truthy(df["IsRecurring"]).to_numpy(), FLAG_RECURRING, 0).astype(np.uint8),
+    }
+
+def _ledger_write(df, meta, offsets, ids=None):
+    """Write encoded rows at the end of each column file (dropping any torn tail past meta['rows'])."""
+    cols = encode_ledger_columns(df, meta)
+    if ids is None:
+        ids = np.arange(meta["next_id"], meta["next_id"] + len(df), dtype=np.int64)
+    cols["id"] = np.asarray(ids, dtype=np.int64)
+    cols["offset"] = np.asarray(offsets, dtype=np.int64)
+    if len(ids):
+        meta["next_id"] = max(meta["next_id"], int(cols["id"].max()) + 1)
+    n = meta["rows"]
+    for name, dtype in LEDGER_COLUMNS.items():
+        path = _ledger_file(name, meta)
+        with open(path, "r+b" if path.exists() else "w+b") as f:
+            f.seek(n * np.dtype(dtype).itemsize)
+            f.write(cols[name].tobytes())
+            f.truncate()
+    meta["rows"] = n + len(df)
+
+def _scan_row_offsets():
+    """Byte offset of every data row in expenses.csv, found by scanning for newlines."""
+    starts = []
+    pos = 0
+    with open(EXPENSES_FILE, "rb") as f:
+        while True:
+            block = f.read(1 << 24)
+            if not block:
+                break
+            starts.append(np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == 10) + pos + 1)
+            pos += len(block)
+    starts = np.concatenate(starts).astype(np.int64) if starts else np.empty(0, dtype=np.int64)
+    return starts[starts < pos]
+
+def rebuild_ledger(df=None, offsets=None, ids=None, new_generation=None):
+    """
+    Rebuild the columnar ledger from `df` + its row offsets, or stream it from expenses.csv when df is None.
+    Rows get fresh IDs unless `ids` is given. A new generation (which invalidates the search index,
+    rollups and snapshot) is started whenever IDs are reassigned, or when new_generation=True.
+    Every rebuild bumps meta["revision"], so caches of row contents can tell an in-place edit happened.
+    """
+    if new_generation is None:
+        new_generation = ids is None
+    LEDGER_DIR.mkdir(parents=True, exist_ok=True)
+    old = load_ledger_meta() or {}
+    meta = {
+        "version": LEDGER_VERSION, "rows": 0, "csv_bytes": None, "categories": [], "payments": [],
+        "next_id": int(old.get("next_id", 1)),
+        "generation": int(old.get("generation", 0)) + (1 if new_generation else 0),
+        "revision": int(old.get("revision", 0)) + 1,
+    }
+    rev_dir = _ledger_revision_dir(meta)
+    shutil.rmtree(rev_dir, ignore_errors=True)   # left by a rebuild that never published its meta
+    rev_dir.mkdir(parents=True)
+    if df is not None:
+        if len(df):
+            _ledger_write(df.reindex(columns=EXPENSE_COLUMNS), meta, offsets, ids)
+    else:
+        row_offsets = _scan_row_offsets()
+        parsed_rows = 0
+        for chunk in pd.read_csv(EXPENSES_FILE, chunksize=EXPORT_CHUNK_ROWS):
+            if meta["rows"] + len(chunk) > len(row_offsets):
+                break
+            if len(chunk):
+                _ledger_write(chunk.reindex(columns=EXPENSE_COLUMNS), meta,
+                              row_offsets[meta["rows"]:meta["rows"] + len(chunk)])
+            parsed_rows += len(chunk)
+        if parsed_rows != len(row_offsets):
+            # blank or multi-line rows: normalise the file so every row is one line again
+            save_expenses(pd.read_csv(EXPENSES_FILE))
+            return load_ledger_meta()
+    meta["csv_bytes"] = EXPENSES_FILE.stat().st_size
+    _save_ledger_meta(meta)
+    _drop_old_ledger_revisions(meta)
+    return meta
+
+def ledger_copy():
+    """In-memory copy of the ledger columns + meta, to diff against after a rewrite."""
+    cols, meta = open_ledger()
+    return {k: np.array(v) for k, v in cols.items() if k != "offset"}, json.loads(json.dumps(meta))
+
+def rewrite_diff(old_cols, old_meta, cols, meta):
+    """
+    For a rewrite that kept IDs (delete, inline edit): positions in the old ledger of rows that
+    were deleted or changed, and positions in the new ledger of their replacements.
+    """
+    old_ids, new_ids = old_cols["id"], np.asarray(cols["id"])
+    at = np.minimum(np.searchsorted(new_ids, old_ids), max(len(new_ids) - 1, 0))
+    same = np.zeros(len(old_ids), dtype=bool)
+    if len(new_ids):
+        same = new_ids[at] == old_ids
+        for name in ("date", "amount", "flags"):
+            same &= np.asarray(cols[name])[at] == old_cols[name]
+        for name, table in (("category", "categories"), ("payment", "payments")):
+            old_labels = np.asarray(old_meta[table], dtype=object)[old_cols[name]]
+            new_labels = np.asarray(meta[table], dtype=object)[np.asarray(cols[name])[at]]
+            same &= old_labels == new_labels
+    added = np.ones(meta["rows"], dtype=bool)
+    added[at[same]] = False
+    return np.flatnonzero(~same), np.flatnonzero(added)
+
+def _invalidate_ledger_meta():
+    """Mark the ledger out of step with the CSV before swapping in a rewrite, so a crash before
+    the new meta is published makes the next open rebuild instead of trusting stale columns."""
+    meta = load_ledger_meta()
+    if meta is not None:
+        meta["csv_bytes"] = None
+        _save_ledger_meta(meta)
+
+def _copy_file_range(src, dst, start, stop):
+    src.seek(start)
+    left = stop - start
+    while left > 0:
+        block = src.read(min(left, 1 << 24))
+        if not block:
+            break
+        dst.write(block)
+        left -= len(block)
+
+def rewrite_expense_rows(positions, rows):
+    """
+    Replace the CSV rows at ledger `positions` with `rows`, keeping every ID and the generation.
+    Bytes between the edited rows are copied across as they are and only the edited rows are
+    encoded again, so a one-cell edit costs a file copy rather than a to_csv and rebuild of the
+    whole ledger. Caller holds ledger_lock().
+    """
+    cols, meta = open_ledger()
+    positions = np.asarray(positions, dtype=np.int64)
+    order = np.argsort(positions, kind="stable")
+    positions, rows = positions[order], _clean_text_fields(rows).iloc[order].reset_index(drop=True)
+    offsets = np.asarray(cols["offset"])
+    ends = np.append(offsets[1:], meta["csv_bytes"])
+    data = rows.to_csv(header=False, index=False).replace("\r\n", "\n").encode("utf-8")
+    lines = [line + b"\n" for line in data.split(b"\n")[:-1]]
+    with open(EXPENSES_FILE, "rb") as src, open(_expenses_tmp_file(), "wb") as dst:
+        pos = 0
+        for p, line in zip(positions, lines):
+            _copy_file_range(src, dst, pos, offsets[p])
+            dst.write(line)
+            pos = ends[p]
+        _copy_file_range(src, dst, pos, meta["csv_bytes"])
+        dst.flush()
+        os.fsync(dst.fileno())
+
+    new_meta = dict(meta, revision=int(meta.get("revision", 0)) + 1,
+                    categories=list(meta["categories"]), payments=list(meta["payments"]))
+    new_cols = {name: np.array(cols[name], dtype=dtype) for name, dtype in LEDGER_COLUMNS.items()}
+    shift = np.zeros(meta["rows"] + 1, dtype=np.int64)
+    shift[positions + 1] = np.array([len(line) for line in lines]) - (ends[positions] - offsets[positions])
+    new_cols["offset"] = offsets + np.cumsum(shift)[:-1]
+    for name, values in encode_ledger_columns(rows, new_meta).items():
+        new_cols[name][positions] = values
+    rev_dir = _ledger_revision_dir(new_meta)
+    shutil.rmtree(rev_dir, ignore_errors=True)
+    rev_dir.mkdir(parents=True)
+    for name, values in new_cols.items():
+        values.tofile(_ledger_file(name, new_meta))
+
+    _invalidate_ledger_meta()
+    os.replace(_expenses_tmp_file(), EXPENSES_FILE)
+    new_meta["csv_bytes"] = EXPENSES_FILE.stat().st_size
+    _save_ledger_meta(new_meta)
+    _drop_old_ledger_revisions(new_meta)
+    return new_meta
+
+def ledger_append(df, offsets, csv_bytes_before):
+    """Append rows that were just added to the CSV; rebuilds instead if the ledger had drifted."""
+    meta = load_ledger_meta()
+    if not _ledger_in_sync(meta, csv_bytes_before):
+        return rebuild_ledger()
+    _ledger_write(df, meta, offsets)
+    meta["csv_bytes"] = EXPENSES_FILE.stat().st_size
+    _save_ledger_meta(meta)
+    return meta
+
+def sync_ledger():
+    meta = load_ledger_meta()
+    if not _ledger_in_sync(meta, EXPENSES_FILE.stat().st_size):
+        with ledger_lock():
+            meta = load_ledger_meta()
+            if not _ledger_in_sync(meta, EXPENSES_FILE.stat().st_size):
+                meta = rebuild_ledger()
+    return meta
+
+def _map_ledger(meta):
+    n = meta["rows"]
+    cols = {}
+    for name, dtype in LEDGER_COLUMNS.items():
+        if n == 0:
+            cols[name] = np.empty(0, dtype=dtype)
+        else:
+            cols[name] = np.memmap(_ledger_file(name, meta), dtype=dtype, mode="r", shape=(n,))
+    return cols
+
+def open_ledger():
+    """Return ({column: read-only memmap}, meta). Nothing is parsed or copied."""
+    for _ in range(3):
+        meta = sync_ledger()
+        try:
+            return _map_ledger(meta), meta
+        except FileNotFoundError:
+            pass   # a rebuild published a new revision and dropped this one after we read meta
+    with ledger_lock():
+        meta = rebuild_ledger()
+        return _map_ledger(meta), meta
+
+def read_expense_rows(positions):
+    """Fetch just the given ledger rows from expenses.csv by seeking to their byte offsets."""
+    cols, _ = open_ledger()
+    positions = np.asarray(positions, dtype=np.int64)
+    lines = []
+    with open(EXPENSES_FILE, "rb") as f:
+        for off in cols["offset"][positions]:
+            f.seek(int(off))
+            lines.append(f.readline().rstrip(b"\r\n"))
+    if not lines:
+        return pd.DataFrame(columns=["Id"] + EXPENSE_COLUMNS)
+    df = pd.read_csv(io.BytesIO(b"\n".join(lines) + b"\n"), header=None, names=EXPENSE_COLUMNS)
+    df["Date"] = pd.to_datetime(df["Date"], errors="coerce").dt.date
+    df.insert(0, "Id", np.asarray(cols["id"][positions]))
+    return df
+
+def ledger_daily_totals(year, month, include_recurring=True):
+    """Per-day spend for the month straight from the ledger columns (empty Series if nothing logged)."""
+    cols, _ = open_ledger()
+    days_in_month = calendar.monthrange(year, month)[1]
+    lo = date(year, month, 1).toordinal()
+    d = cols["date"]
+    mask = (d >= lo) & (d < lo + days_in_month)
+    if not include_recurring:
+        mask &= (cols["flags"] & FLAG_RECURRING) == 0
+    if not mask.any():
+        return pd.Series(dtype=float)
+    sums = np.bincount(d[mask] - lo, weights=cols["amount"][mask], minlength=days_in_month) / 100.0
+    idx = pd.date_range(date(year, month, 1), periods=days_in_month).date
+    return pd.Series(sums, index=idx)
+
+def ledger_month_summary(year, month, today=None):
+    """Month total, today's total and the category split for the month, from the ledger columns."""
+    cols, meta = open_ledger()
+    days_in_month = calendar.monthrange(year, month)[1]
+    lo = date(year, month, 1).toordinal()
+    d = cols["date"]
+    mask = (d >= lo) & (d < lo + days_in_month)
+    amounts = cols["amount"][mask]
+    by_cat = np.bincount(cols["category"][mask], weights=amounts, minlength=len(meta["categories"])) / 100.0
+    categories = pd.Series(by_cat, index=meta["categories"])
+    today_total = 0.0
+    if today is not None:
+        today_total = float(amounts[d[mask] == today.toordinal()].sum()) / 100.0
+    return {
+        "rows": int(mask.sum()),
+        "total": float(amounts.sum()) / 100.0,
+        "today_total": today_total,
+        "categories": categories[categories != 0],
+    }
+
+# ---------------------
+# Expense search
+# ---------------------
+# Inverted index over Notes / Category / PaymentType: token -> ascending array of expense IDs.
+# Appends are picked up by indexing only the rows past index["last_id"]; deleted IDs are
+# simply skipped at query time. A new ledger generation (IDs reassigned) means a full rebuild.
+SEARCH_PAGE_SIZE = 25
+_TOKEN_RE = r"\w+"
+
+def tokenize(text):
+    return re.findall(_TOKEN_RE, str(text).lower())
+
+def _postings_from_rows(df, ids):
+    """Build token -> sorted ID array for a batch of rows with vectorised string ops."""
+    text = (df["Notes"].fillna("").astype(str) + " " + df["Category"].fillna("").astype(str)
+            + " " + df["PaymentType"].fillna("").astype(str))
+    frame = pd.DataFrame({"id": np.asarray(ids, dtype=np.int64), "tok": text.str.lower().str.findall(_TOKEN_RE).to_numpy()})
+    frame = frame.explode("tok").dropna().drop_duplicates()
+    if frame.empty:
+        return {}
+    frame = frame.sort_values(["tok", "id"], kind="stable")
+    toks = frame["tok"].to_numpy()
+    id_vals = frame["id"].to_numpy(dtype=np.int64)
+    bounds = np.flatnonzero(toks[1:] != toks[:-1]) + 1
+    return dict(zip(toks[np.concatenate([[0], bounds])], np.split(id_vals, bounds)))
+
+def _merge_postings(index, postings):
+    new_tokens = False
+    for tok, ids in postings.items():
+        old = index["postings"].get(tok)
+        if old is None:
+            index["postings"][tok] = ids
+            new_tokens = True
+        else:
+            index["postings"][tok] = np.concatenate([old, ids])
+    if new_tokens:
+        index["vocab"] = sorted(index["postings"])
+
+@st.cache_resource(show_spinner=False)
+def _search_index_holder(path):
+    """Per-process home for the loaded index so reruns don't unpickle it again."""
+    return {"index": None}
+
+def _save_search_index(index):
+    tmp = SEARCH_INDEX_FILE.with_suffix(".tmp")
+    with open(tmp, "wb") as f:
+        pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, SEARCH_INDEX_FILE)
+
+def _build_search_index(cols, meta):
+    index = {"generation": meta["generation"], "last_id": 0, "postings": {}, "vocab": []}
+    done = 0
+    for chunk in pd.read_csv(EXPENSES_FILE, chunksize=EXPORT_CHUNK_ROWS):
+        ids = cols["id"][done:done + len(chunk)]
+        _merge_postings(index, _postings_from_rows(chunk, ids))
+        done += len(chunk)
+    if meta["rows"]:
+        index["last_id"] = int(cols["id"][-1])
+    return index
+
+def _catch_up_search_index(index, cols, meta):
+    """Index only the rows appended since the last query."""
+    first = int(np.searchsorted(cols["id"], index["last_id"], side="right"))
+    if first >= meta["rows"]:
+        return False
+    with open(EXPENSES_FILE, "rb") as f:
+        f.seek(int(cols["offset"][first]))
+        # only the bytes these ledger columns cover; another session may have appended since
+        tail = pd.read_csv(io.BytesIO(f.read(meta["csv_bytes"] - int(cols["offset"][first]))),
+                           header=None, names=EXPENSE_COLUMNS)
+    _merge_postings(index, _postings_from_rows(tail, cols["id"][first:first + len(tail)]))
+    index["last_id"] = int(cols["id"][-1])
+    return True
+
+def load_search_index():
+    """The search index, caught up to the ledger as it is right now."""
+    # the cached index is shared by every session of this user, so build / catch up one at a time
+    # against columns read under the lock (any held by the caller may be behind by now)
+    with ledger_lock():
+        cols, meta = open_ledger()
+        return _load_search_index(cols, meta)
+
+def _load_search_index(cols, meta):
+    holder = _search_index_holder(str(SEARCH_INDEX_FILE.resolve()))
+    index = holder["index"]
+    if index is None and SEARCH_INDEX_FILE.exists():
+        try:
+            with open(SEARCH_INDEX_FILE, "rb") as f:
+                index = pickle.load(f)
+        except Exception:
+            index = None
+    if index is None or index.get("generation") != meta["generation"]:
+        index = _build_search_index(cols, meta)
+        _save_search_index(index)
+    elif _catch_up_search_index(index, cols, meta):
+        _save_search_index(index)
+    holder["index"] = index
+    return index
+
+def patch_search_index(before, after):
+    """Re-index rows edited in place (same Ids): drop the tokens of their old text, add the new ones."""
+    with ledger_lock():
+        index = load_search_index()
+        postings = index["postings"]
+        for tok, ids in _postings_from_rows(before, before["Id"]).items():
+            left = np.setdiff1d(postings.get(tok, ids), ids)
+            if len(left):
+                postings[tok] = left
+            else:
+                postings.pop(tok, None)
+        for tok, ids in _postings_from_rows(after, after["Id"]).items():
+            postings[tok] = np.union1d(postings.get(tok, ids), ids)
+        index["vocab"] = sorted(postings)
+        _save_search_index(index)
+
+def _prefix_postings(index, term):
+    """IDs of every expense containing a token that starts with `term`."""
+    vocab = index["vocab"]
+    hits = []
+    i = bisect.bisect_left(vocab, term)
+    while i < len(vocab) and vocab[i].startswith(term):
+        hits.append(index["postings"][vocab[i]])
+        i += 1
+    if not hits:
+        return np.empty(0, dtype=np.int64)
+    return hits[0] if len(hits) == 1 else np.unique(np.concatenate(hits))
+
+def search_expenses(query="", start=None, end=None, min_amount=None, max_amount=None, categories=None,
+                    page=0, page_size=SEARCH_PAGE_SIZE):
+    """
+    Find expenses whose notes/category/payment type contain every query term (prefix match),
+    narrowed by date range, amount range and categories. Newest first, one page at a time.
+    """
+    cols, meta = open_ledger()
+    all_ids = cols["id"]
+    terms = tokenize(query)
+    if terms:
+        index = load_search_index()
+        ids = None
+        for term in terms:
+            hits = _prefix_postings(index, term)
+            ids = hits if ids is None else np.intersect1d(ids, hits, assume_unique=True)
+            if len(ids) == 0:
+                break
+        pos = np.searchsorted(all_ids, ids)
+        in_range = pos < len(all_ids)
+        pos, ids = pos[in_range], ids[in_range]
+        pos = pos[all_ids[pos] == ids]       # drop IDs deleted since they were indexed
+    else:
+        pos = np.arange(meta["rows"])
+    mask = np.ones(len(pos), dtype=bool)
+    d = cols["date"][pos]
+    amt = cols["amount"][pos]
+    if start is not None:
+        mask &= d >= start.toordinal()
+    if end is not None:
+        mask &= d <= end.toordinal()
+    if min_amount is not None:
+        mask &= amt >= round(min_amount * 100)
+    if max_amount is not None:
+        mask &= amt <= round(max_amount * 100)
+    if categories:
+        codes = [i for i, c in enumerate(meta["categories"]) if c in set(categories)]
+        mask &= np.isin(cols["category"][pos], codes)
+    pos = pos[mask]
+    order = np.lexsort((all_ids[pos], cols["date"][pos]))[::-1]
+    total = len(pos)
+    page_pos = pos[order][page * page_size:(page + 1) * page_size]
+    return {
+        "total": total,
+        "page": page,
+        "pages": -(-total // page_size),
+        "rows": read_expense_rows(page_pos),
+    }
+
+def search_recurring(query):
+    """Recurring rules whose name/category match every query term (the rules table is small)."""
+    rec = load_recurring()
+    terms = tokenize(query)
+    if rec.empty or not terms:
+        return rec
+    rule_tokens = (rec["Name"].fillna("").astype(str) + " " + rec["Category"].fillna("").astype(str)).map(tokenize)
+    keep = rule_tokens.map(lambda toks: all(any(t.startswith(term) for t in toks) for term in terms))
+    return rec[keep]
+
+# ---------------------
+# Unusual spend detection
+# ---------------------
+# Per-category exponentially weighted sums of log(amount): s0 = sum(w), s1 = sum(w*x), s2 = sum(w*x^2),
+# plus the same s0/s1 split by weekday. Each new row decays the category's sums by ANOMALY_DECAY, so a
+# whole batch folds in with one weighted bincount. New rows are scored against the stats from before the batch.
+ANOMALY_DECAY = 0.97          # per expense in the category (~23-expense half-life)
+ANOMALY_MIN_WEIGHT = 5.0      # need roughly this many past expenses before flagging
+ANOMALY_MIN_STD = 0.25        # log-space floor so identical amounts don't make everything "unusual"
+ANOMALY_DOW_PRIOR = 3.0       # shrink the weekday profile towards the category mean
+ANOMALY_Z = 3.0
+ANOMALY_RECENT_KEEP = 20
+
+def _new_anomaly_state(meta):
+    return {"generation": meta["generation"], "last_id": 0, "categories": {}, "recent": []}
+
+def load_anomaly_state():
+    return read_json(ANOMALY_STATE_FILE)
+
+def save_anomaly_state(state):
+    write_json_atomic(ANOMALY_STATE_FILE, state)
+
+def _anomaly_inputs(cols, start, stop):
+    d = np.asarray(cols["date"][start:stop], dtype=np.int64)
+    x = np.log1p(np.asarray(cols["amount"][start:stop]) / 100.0)
+    dow = np.where(d > 0, (d + 6) % 7, 0)   # ordinal 1 (0001-01-01) was a Monday
+    return np.asarray(cols["category"][start:stop], dtype=np.int64), x, dow
+
+def _category_stat_table(state, labels, codes):
+    """Stack the stored sums for the categories present in `codes` into arrays."""
+    tab = np.zeros((len(codes), 3))
+    dow0 = np.zeros((len(codes), 7))
+    dow1 = np.zeros((len(codes), 7))
+    for j, code in enumerate(codes):
+        c = state["categories"].get(labels[code])
+        if c:
+            tab[j] = [c["s0"], c["s1"], c["s2"]]
+            dow0[j] = c["dow_s0"]
+            dow1[j] = c["dow_s1"]
+    return tab, dow0, dow1
+
+def score_anomalies(state, labels, cats, x, dow):
+    """Vectorised z-score of each row against its category's stats. Returns (z, expected_log, flagged)."""
+    uniq, inv = np.unique(cats, return_inverse=True)
+    tab, dow0, dow1 = _category_stat_table(state, labels, uniq)
+    s0, s1, s2 = tab[inv, 0], tab[inv, 1], tab[inv, 2]
+    mean = np.divide(s1, s0, out=np.zeros_like(s1), where=s0 > 0)
+    var = np.divide(s2, s0, out=np.zeros_like(s2), where=s0 > 0) - mean ** 2
+    std = np.sqrt(np.maximum(var, ANOMALY_MIN_STD ** 2))
+    d0, d1 = dow0[inv, dow], dow1[inv, dow]
+    dow_mean = np.divide(d1, d0, out=mean.copy(), where=d0 > 0)
+    expected = mean + (dow_mean - mean) * d0 / (d0 + ANOMALY_DOW_PRIOR)
+    z = (x - expected) / std
+    return z, expected, (s0 >= ANOMALY_MIN_WEIGHT) & (z > ANOMALY_Z)
+
+def fold_anomaly_stats(state, labels, cats, x, dow):
+    """Fold a batch (in ledger order) into the per-category EW sums in one pass."""
+    if len(cats) == 0:
+        return
+    uniq, inv = np.unique(cats, return_inverse=True)
+    k = len(uniq)
+    counts = np.bincount(inv, minlength=k)
+    order = np.argsort(inv, kind="stable")
+    rank = np.empty(len(inv), dtype=np.int64)
+    rank[order] = np.arange(len(inv)) - np.repeat(np.cumsum(counts) - counts, counts)
+    w = ANOMALY_DECAY ** (counts[inv] - 1 - rank)
+    s0 = np.bincount(inv, w, k)
+    s1 = np.bincount(inv, w * x, k)
+    s2 = np.bincount(inv, w * x * x, k)
+    d0 = np.bincount(inv * 7 + dow, w, k * 7).reshape(k, 7)
+    d1 = np.bincount(inv * 7 + dow, w * x, k * 7).reshape(k, 7)
+    for j, code in enumerate(uniq):
+        c = state["categories"].setdefault(labels[code], {"s0": 0.0, "s1": 0.0, "s2": 0.0,
+                                                         "dow_s0": [0.0] * 7, "dow_s1": [0.0] * 7})
+        f = ANOMALY_DECAY ** counts[j]
+        c["s0"] = c["s0"] * f + s0[j]
+        c["s1"] = c["s1"] * f + s1[j]
+        c["s2"] = c["s2"] * f + s2[j]
+        c["dow_s0"] = (np.asarray(c["dow_s0"]) * f + d0[j]).tolist()
+        c["dow_s1"] = (np.asarray(c["dow_s1"]) * f + d1[j]).tolist()
+
+def score_new_expenses(n_new):
+    """
+    Score the last n_new ledger rows against the stats from before them, fold them in and persist.
+    Returns the flagged rows (empty DataFrame when nothing looks odd).
+    """
+    cols, meta = open_ledger()
+    labels = meta["categories"]
+    first = max(meta["rows"] - n_new, 0)
+    state = load_anomaly_state()
+    first_new_id = int(cols["id"][first]) if first < meta["rows"] else meta["next_id"]
+    if (state is None or state.get("generation") != meta["generation"]
+            or state.get("last_id", 0) >= first_new_id):
+        state = _new_anomaly_state(meta)
+        fold_anomaly_stats(state, labels, *_anomaly_inputs(cols, 0, first))
+    else:
+        # stats saved before some earlier rows were committed (e.g. restored from a snapshot)
+        behind = int(np.searchsorted(cols["id"], state["last_id"], side="right"))
+        if behind < first:
+            fold_anomaly_stats(state, labels, *_anomaly_inputs(cols, behind, first))
+    cats, x, dow = _anomaly_inputs(cols, first, meta["rows"])
+    z, expected, flagged = score_anomalies(state, labels, cats, x, dow)
+    fold_anomaly_stats(state, labels, cats, x, dow)
+    if meta["rows"]:
+        state["last_id"] = int(cols["id"][meta["rows"] - 1])
+    hits = np.flatnonzero(flagged)
+    found = pd.DataFrame({
+        "Id": np.asarray(cols["id"][first:])[hits],
+        "Date": [date.fromordinal(int(o)) if o > 0 else None for o in np.asarray(cols["date"][first:])[hits]],
+        "Category": [labels[c] for c in cats[hits]],
+        "Amount": np.asarray(cols["amount"][first:])[hits] / 100.0,
+        "Typical": np.round(np.expm1(expected[hits]), 2),
+        "Score": np.round(z[hits], 1),
+    })
+    if len(found):
+        recent = json.loads(found.tail(ANOMALY_RECENT_KEEP).astype({"Date": str}).to_json(orient="records"))
+        state["recent"] = (state.get("recent", []) + recent)[-ANOMALY_RECENT_KEEP:]
+    save_anomaly_state(state)
+    return found
+
+def show_append_report(report):
+    """Shout about unusual spends and budget alerts from an append_expense_rows report."""
+    if not report:
+        return
+    for alert in report.get("alerts") or []:
+        st.warning(alert["message"])
+    found = report.get("anomalies")
+    if found is None or found.empty:
+        return
+    if len(found) == 1:
+        r = found.iloc[0]
+        st.warning(f"🚨 Whoa! ₹{r['Amount']:.2f} on {r['Category']} is way above your usual ~₹{r['Typical']:.2f}. Treat yourself much? 👀")
+    else:
+        st.warning(f"🚨 {len(found)} of these look unusually big for their category:")
+        st.dataframe(found, hide_index=True, use_container_width=True)
+
+# ---------------------
+# Budget alerts
+# ---------------------
+# Running spend totals per month (overall + per category) and per ISO week, kept in
+# alert_state.json. Each append folds only its own rows in, then checks the current
+# month/week against the limits in settings.json and fires each threshold once.
+# Fired alerts are also appended to alerts_outbox.jsonl for anything that delivers them.
+ALERT_LEVELS = (0.8, 1.0)
+
+def _new_alert_state(meta):
+    return {"generation": meta["generation"], "last_id": 0, "rows": 0,
+            "months": {}, "weeks": {}, "fired": {}, "seen": 0}
+
+def load_alert_state():
+    return read_json(ALERT_STATE_FILE)
+
+def save_alert_state(state):
+    write_json_atomic(ALERT_STATE_FILE, state)
+
+def _week_key(d):
+    iso = d.isocalendar()
+    return f"{iso[0]}-W{iso[1]:02d}"
+
+def fold_alert_totals(state, labels, cols, positions, sign=1):
+    """Add the given ledger rows to (sign=-1: take them out of) the month / category / week running totals."""
+    positions = np.asarray(positions, dtype=np.int64)
+    if len(positions) == 0:
+        return
+    ords = np.asarray(cols["date"][positions], dtype=np.int64)
+    valid = ords > 0
+    when = pd.to_datetime(ords[valid] - _EPOCH_ORDINAL, unit="D")
+    iso = when.isocalendar()
+    batch = pd.DataFrame({
+        "month": when.strftime("%Y-%m"),
+        "week": iso["year"].astype(str).to_numpy() + "-W" + iso["week"].astype(str).str.zfill(2).to_numpy(),
+        "category": np.asarray(labels, dtype=object)[np.asarray(cols["category"][positions])[valid]],
+        "amount": np.asarray(cols["amount"][positions], dtype=np.int64)[valid] * sign,
+    })
+    for (month, cat), amt in batch.groupby(["month", "category"])["amount"].sum().items():
+        m = state["months"].setdefault(month, {"total": 0, "categories": {}})
+        m["total"] += int(amt)
+        m["categories"][cat] = m["categories"].get(cat, 0) + int(amt)
+        if m["categories"][cat] == 0:
+            del m["categories"][cat]
+    for week, amt in batch.groupby("week")["amount"].sum().items():
+        state["weeks"][week] = state["weeks"].get(week, 0) + int(amt)
+        if state["weeks"][week] == 0:
+            del state["weeks"][week]
+
+def _alert_checks(state, settings, today):
+    """(kind, period, spent, limit, label) for every limit that applies right now."""
+    mkey, wkey = f"{today.year}-{today.month:02d}", _week_key(today)
+    month = state["months"].get(mkey, {"total": 0, "categories": {}})
+    spent = month["total"] / 100.0
+    checks = []
+    budget = settings.get("monthly_budget")
+    if budget:
+        checks.append(("budget", mkey, spent, float(budget), "monthly budget"))
+    weekly = settings.get("weekly_budget") or (
+        float(budget) * 7 / calendar.monthrange(today.year, today.month)[1] if budget else None)
+    if weekly:
+        checks.append(("weekly", wkey, state["weeks"].get(wkey, 0) / 100.0, float(weekly), "weekly budget"))
+    income, goal = settings.get("monthly_income"), settings.get("savings_goal")
+    if income and goal and income > goal:
+        checks.append(("savings", mkey, spent, float(income - goal), f"savings goal (₹{goal:.0f})"))
+    for cat, limit in (settings.get("category_limits") or {}).items():
+        if limit:
+            checks.append((f"category:{cat}", mkey, month["categories"].get(cat, 0) / 100.0, float(limit), f"{cat} limit"))
+    return checks
+
+def _alert_message(kind, level, spent, limit, label):
+    if kind == "savings":
+        if level >= 1.0:
+            return f"🐷💔 Spending (₹{spent:.0f}) has eaten into your {label} — only ₹{limit:.0f} was spendable."
+        return f"🐷 Careful! You've used {int(level * 100)}% of what you can spend and still hit your {label}."
+    if level >= 1.0:
+        return f"💥 Blown through your {label}: ₹{spent:.0f} of ₹{limit:.0f}."
+    return f"⚠️ {int(level * 100)}% of your {label} is gone: ₹{spent:.0f} of ₹{limit:.0f}."
+
+def evaluate_alerts(state, settings, today=None):
+    """Fire every threshold crossed in the current period that hasn't fired yet. Returns new alerts."""
+    today = today or date.today()
+    current = {f"{today.year}-{today.month:02d}", _week_key(today)}
+    state["fired"] = {k: v for k, v in state["fired"].items() if k.split("|")[0] in current}
+    fired = []
+    for kind, period, spent, limit, label in _alert_checks(state, settings, today):
+        for level in ALERT_LEVELS:
+            key = f"{period}|{kind}|{int(level * 100)}"
+            if spent >= limit * level and key not in state["fired"]:
+                state["fired"][key] = datetime.now().isoformat(timespec="seconds")
+                fired.append({"key": key, "kind": kind, "period": period, "level": level,
+                              "spent": round(spent, 2), "limit": round(limit, 2),
+                              "message": _alert_message(kind, level, spent, limit, label),
+                              "created": state["fired"][key]})
+    # a bigger threshold supersedes the smaller one fired in the same write
+    return [a for a in fired if not any(b["kind"] == a["kind"] and b["level"] > a["level"] for b in fired)]
+
+def push_alerts(alerts):
+    if not alerts:
+        return
+    with open(ALERT_OUTBOX_FILE, "a") as f:
+        for a in alerts:
+            f.write(json.dumps(dict(a, data_dir=str(DATA_DIR))) + "\n")
+
+def _synced_alert_state(cols, meta, upto):
+    """Alert state covering ledger rows [0, upto); rebuilt from the ledger columns if it drifted."""
+    state = load_alert_state()
+    prior_id = int(cols["id"][upto - 1]) if upto > 0 else 0
+    seen_rows = state.get("rows", -1) if state else -1
+    # totals can be caught up only if no row they cover has been deleted since
+    in_step = (state is not None and state.get("generation") == meta["generation"]
+               and 0 <= seen_rows <= upto
+               and state.get("last_id") == (int(cols["id"][seen_rows - 1]) if seen_rows > 0 else 0))
+    if not in_step:
+        old = state or {}
+        state = _new_alert_state(meta)
+        state["fired"], state["seen"] = old.get("fired", {}), old.get("seen", 0)
+        fold_alert_totals(state, meta["categories"], cols, np.arange(upto))
+    elif seen_rows < upto:
+        fold_alert_totals(state, meta["categories"], cols, np.arange(seen_rows, upto))
+    state["rows"], state["last_id"] = upto, prior_id
+    return state
+
+def update_alert_totals_after_rewrite(old_cols, old_meta):
+    """Take deleted / changed rows out of the running totals and put their new versions in."""
+    cols, meta = open_ledger()
+    state = load_alert_state()
+    if state is None or state.get("generation") != old_meta["generation"] or state.get("rows") != old_meta["rows"]:
+        return   # not in step with the old ledger; check_alerts refolds it from scratch
+    removed, added = rewrite_diff(old_cols, old_meta, cols, meta)
+    fold_alert_totals(state, old_meta["categories"], old_cols, removed, sign=-1)
+    fold_alert_totals(state, meta["categories"], cols, added)
+    state["generation"], state["rows"] = meta["generation"], meta["rows"]
+    state["last_id"] = int(cols["id"][-1]) if meta["rows"] else 0
+    save_alert_state(state)
+
+def update_alert_totals(n_new):
+    """Fold the last n_new ledger rows into the running totals and fire any crossed thresholds."""
+    cols, meta = open_ledger()
+    first = max(meta["rows"] - n_new, 0)
+    state = _synced_alert_state(cols, meta, first)
+    fold_alert_totals(state, meta["categories"], cols, np.arange(first, meta["rows"]))
+    state["rows"] = meta["rows"]
+    state["last_id"] = int(cols["id"][meta["rows"] - 1]) if meta["rows"] else 0
+    alerts = evaluate_alerts(state, load_settings())
+    save_alert_state(state)
+    push_alerts(alerts)
+    return alerts
+
+def check_alerts(today=None):
+    """Re-check the current period (e.g. after settings change or from the headless batch)."""
+    with ledger_lock():
+        cols, meta = open_ledger()
+        state = _synced_alert_state(cols, meta, meta["rows"])
+        alerts = evaluate_alerts(state, load_settings(), today)
+        save_alert_state(state)
+        push_alerts(alerts)
+    return alerts
+
+def pending_alerts():
+    """Outbox entries the user hasn't dismissed in the app yet."""
+    if not ALERT_OUTBOX_FILE.exists():
+        return []
+    state = load_alert_state() or {}
+    with open(ALERT_OUTBOX_FILE, "r") as f:
+        lines = f.readlines()
+    return [json.loads(l) for l in lines[state.get("seen", 0):] if l.strip()]
+
+def dismiss_alerts():
+    with ledger_lock():
+        state = load_alert_state()
+        if state is None or not ALERT_OUTBOX_FILE.exists():
+            return
+        with open(ALERT_OUTBOX_FILE, "r") as f:
+            state["seen"] = sum(1 for _ in f)
+        save_alert_state(state)
+
+def ledger_dirs():
+    """Every per-user ledger under data/users/ (plus a pre-accounts ledger still sitting in data/)."""
+    if ACCOUNTS_FILE.exists():
+        load_accounts()   # moves the default user's ledger out of data/ if that hasn't happened yet
+    dirs = [ROOT_DATA_DIR] if (ROOT_DATA_DIR / "expenses.csv").exists() else []
+    if USERS_DIR.exists():
+        dirs += sorted(p for p in USERS_DIR.iterdir() if (p / "expenses.csv").exists())
+    return dirs
+
+def run_alert_batch(dirs=None):
+    """Headless: check every ledger and write any new alerts to its outbox. Returns {dir: n_alerts}."""
+    results = {}
+    for d in dirs or ledger_dirs():
+        set_data_dir(d)
+        if not EXPENSES_FILE.exists():
+            continue
+        ensure_files()
+        results[str(d)] = len(check_alerts())
+    return results
+
+# ---------------------
+# Analytics cube
+# ---------------------
+# Spend (paise) and row counts per period x category x payment type x recurring flag, kept in
+# cube.json for every month ("2026-01"), quarter ("2026-Q1") and year ("2026") alongside the
+# per-dimension margins. Appends fold in only their own rows; a rewrite that keeps IDs (delete,
+# inline edit) takes out the old version of each changed row and adds the new one, so only the
+# periods those rows fall in move. Comparisons are then a couple of dictionary lookups.
+CUBE_DIMENSIONS = ("category", "payment", "recurring")
+CUBE_TOP_MOVERS = 5
+
+def _new_cube(meta):
+    return {"generation": meta["generation"], "rows": 0, "last_id": 0, "periods": {}}
+
+def load_cube():
+    return read_json(CUBE_FILE)
+
+def save_cube(cube):
+    write_json_atomic(CUBE_FILE, cube)
+
+def _cube_batch(cols, meta, positions, sign=1):
+    """Cube rows for the given ledger positions, amounts negated when sign=-1."""
+    positions = np.asarray(positions, dtype=np.int64)
+    ords = np.asarray(cols["date"][positions], dtype=np.int64)
+    valid = ords > 0
+    positions = positions[valid]
+    when = pd.to_datetime(ords[valid] - _EPOCH_ORDINAL, unit="D")
+    return pd.DataFrame({
+        "month": when.strftime("%Y-%m"),
+        "category": np.asarray(meta["categories"], dtype=object)[np.asarray(cols["category"][positions])],
+        "payment": np.asarray(meta["payments"], dtype=object)[np.asarray(cols["payment"][positions])],
+        "recurring": (np.asarray(cols["flags"][positions]) & FLAG_RECURRING) > 0,
+        "amount": np.asarray(cols["amount"][positions], dtype=np.int64) * sign,
+        "count": sign,
+    })
+
+def _bump(table, key, amount):
+    table[key] = table.get(key, 0) + amount
+    if table[key] == 0:
+        del table[key]
+
+def fold_cube(cube, batch):
+    """Add a batch (or take it out, if its amounts/counts are negative) in every period it touches."""
+    if batch.empty:
+        return
+    grouped = batch.groupby(["month", "category", "payment", "recurring"])[["amount", "count"]].sum()
+    periods = cube["periods"]
+    for (month, cat, pay, rec), amt, n in zip(grouped.index, grouped["amount"], grouped["count"]):
+        amt, n, rec = int(amt), int(n), "yes" if rec else "no"
+        year, mon = month.split("-")
+        for key in (month, f"{year}-Q{(int(mon) - 1) // 3 + 1}", year):
+            p = periods.setdefault(key, {"total": 0, "count": 0, "cells": {},
+                                         **{dim: {} for dim in CUBE_DIMENSIONS}})
+            p["total"] += amt
+            p["count"] += n
+            _bump(p["category"], cat, amt)
+            _bump(p["payment"], pay, amt)
+            _bump(p["recurring"], rec, amt)
+            _bump(p["cells"], f"{cat}|{pay}|{rec}", amt)
+            if p["count"] == 0:
+                del periods[key]
+
+def _cube_in_step(cube, cols, meta):
+    seen = cube.get("rows", -1) if cube else -1
+    return (cube is not None and cube.get("generation") == meta["generation"]
+            and 0 <= seen <= meta["rows"]
+            and cube.get("last_id") == (int(cols["id"][seen - 1]) if seen > 0 else 0))
+
+def update_cube():
+    """Fold ledger rows the cube hasn't seen yet (all of them if it drifted). Returns the cube."""
+    cols, meta = open_ledger()
+    cube = load_cube()
+    if not _cube_in_step(cube, cols, meta):
+        cube = _new_cube(meta)
+    elif cube["rows"] == meta["rows"]:
+        return cube
+    fold_cube(cube, _cube_batch(cols, meta, np.arange(cube["rows"], meta["rows"])))
+    cube["rows"] = meta["rows"]
+    cube["last_id"] = int(cols["id"][meta["rows"] - 1]) if meta["rows"] else 0
+    save_cube(cube)
+    return cube
+
+def update_cube_after_rewrite(old_cols, old_meta):
+    """
+    Move only rows that a rewrite keeping IDs deleted or changed: old versions come out of
+    their periods, new versions go in. Falls back to a full refold if the cube was behind.
+    """
+    cols, meta = open_ledger()
+    cube = load_cube()
+    if not _cube_in_step(cube, old_cols, old_meta) or cube["rows"] != old_meta["rows"]:
+        save_cube(_new_cube(meta))
+        update_cube()
+        return
+    removed, added = rewrite_diff(old_cols, old_meta, cols, meta)
+    fold_cube(cube, _cube_batch(old_cols, old_meta, removed, sign=-1))
+    fold_cube(cube, _cube_batch(cols, meta, added))
+    cube["generation"], cube["rows"] = meta["generation"], meta["rows"]
+    cube["last_id"] = int(cols["id"][-1]) if meta["rows"] else 0
+    save_cube(cube)
+
+def period_key(d, grain="month"):
+    if grain == "year":
+        return str(d.year)
+    if grain == "quarter":
+        return f"{d.year}-Q{(d.month - 1) // 3 + 1}"
+    return f"{d.year}-{d.month:02d}"
+
+def shift_period(key, steps):
+    """The period `steps` periods before key (same grain): shift_period("2026-Q1", 1) == "2025-Q4"."""
+    if "-Q" in key:
+        year, q = key.split("-Q")
+        n = int(year) * 4 + int(q) - 1 - steps
+        return f"{n // 4}-Q{n % 4 + 1}"
+    if "-" in key:
+        year, mon = key.split("-")
+        n = int(year) * 12 + int(mon) - 1 - steps
+        return f"{n // 12}-{n % 12 + 1:02d}"
+    return str(int(key) - steps)
+
+def compare_periods(cube, current, previous, dimension="category", top=CUBE_TOP_MOVERS):
+    """Totals for two periods plus the biggest movers along one dimension (amounts in ₹)."""
+    empty = {"total": 0, "count": 0, dimension: {}}
+    cur, prev = cube["periods"].get(current, empty), cube["periods"].get(previous, empty)
+    movers = []
+    for label in set(cur[dimension]) | set(prev[dimension]):
+        now, then = cur[dimension].get(label, 0), prev[dimension].get(label, 0)
+        movers.append({dimension: label, "now": now / 100.0, "then": then / 100.0, "change": (now - then) / 100.0})
+    movers.sort(key=lambda m: abs(m["change"]), reverse=True)
+    change = (cur["total"] - prev["total"]) / 100.0
+    return {
+        "current": current, "previous": previous,
+        "total": cur["total"] / 100.0, "previous_total": prev["total"] / 100.0, "change": change,
+        "pct": change / (prev["total"] / 100.0) * 100 if prev["total"] else None,
+        "movers": movers[:top],
+    }
+
+def period_comparisons(cube, today=None, grain="month", dimension="category"):
+    """Current period vs the one before it, and vs the same period a year ago."""
+    key = period_key(today or date.today(), grain)
+    per_year = {"month": 12, "quarter": 4, "year": 1}[grain]
+    return {
+        "previous": compare_periods(cube, key, shift_period(key, 1), dimension),
+        "last_year": compare_periods(cube, key, shift_period(key, per_year), dimension),
+    }
+
+# ---------------------
+# Snapshot + journal
+# ---------------------
+# Appends are written ahead to journal.jsonl (fsynced) before they touch the CSV, so a crash
+# mid-write can be finished on the next start. snapshot.pkl holds the typed expense frame up to
+# some ID plus copies of the rollups and search index; a cold load is snapshot + journal tail
+# instead of a CSV parse. Once the journal grows past SNAPSHOT_JOURNAL_BYTES a fresh snapshot
+# is written on a background thread and the journal is trimmed to what it doesn't cover.
+SNAPSHOT_JOURNAL_BYTES = 512 * 1024
+
+def _typed_expenses(df):
+    df = df.reindex(columns=EXPENSE_COLUMNS).copy()
+    df["Date"] = pd.to_datetime(df["Date"], errors="coerce").dt.date
+    df["Amount"] = pd.to_numeric(df["Amount"], errors="coerce")
+    return df
+
+def journal_append(df, ids, generation):
+    out = df.reindex(columns=EXPENSE_COLUMNS).copy()
+    out["Date"] = pd.to_datetime(out["Date"], errors="coerce").dt.strftime("%Y-%m-%d")
+    out["CreatedAt"] = out["CreatedAt"].map(lambda v: None if pd.isna(v) else str(v))
+    out.insert(0, "Id", np.asarray(ids, dtype=np.int64))
+    out.insert(0, "gen", generation)
+    text = out.to_json(orient="records", lines=True)
+    with open(JOURNAL_FILE, "a", encoding="utf-8") as f:
+        f.write(text if text.endswith("\n") else text + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+def read_journal(generation, after_id=0, path=None):
+    """Journal rows of this ledger generation with Id > after_id. A torn last line is skipped."""
+    path = path or JOURNAL_FILE
+    if not path.exists():
+        return []
+    rows = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                r = json.loads(line)
+            except ValueError:
+                continue
+            if r.get("gen") == generation and r["Id"] > after_id:
+                rows.append(r)
+    return rows
+
+def compact_journal(generation, upto_id, path=None):
+    """Drop journal lines already covered by a snapshot (or from an old generation)."""
+    path = path or JOURNAL_FILE
+    keep = read_journal(generation, after_id=upto_id, path=path)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        for r in keep:
+            f.write(json.dumps(r) + "\n")
+    os.replace(tmp, path)
+
+@st.cache_resource(show_spinner=False)
+def _snapshot_holder(path):
+    return {"snap": None, "mtime": None, "running": False}
+
+def load_snapshot():
+    if not SNAPSHOT_FILE.exists():
+        return None
+    holder = _snapshot_holder(str(SNAPSHOT_FILE.resolve()))
+    mtime = SNAPSHOT_FILE.stat().st_mtime_ns
+    if holder["mtime"] != mtime:
+        try:
+            with open(SNAPSHOT_FILE, "rb") as f:
+                holder["snap"] = pickle.load(f)
+            holder["mtime"] = mtime
+        except Exception:
+            return None
+    return holder["snap"]
+
+def _snapshot_payload(frame, meta):
+    """What a snapshot holds, gathered from the current data dir: frame (with its Id column), rollups, search index."""
+    with ledger_lock():
+        # postings arrays are replaced, never changed in place, so copying the dict is enough
+        index = _search_index_holder(str(SEARCH_INDEX_FILE.resolve()))["index"]
+        if index is not None:
+            index = dict(index, postings=dict(index["postings"]))
+    return {
+        "generation": meta["generation"],
+        "revision": meta.get("revision"),
+        "last_id": int(frame["Id"].max()) if len(frame) else 0,
+        "frame": frame.reset_index(drop=True),
+        "alerts": load_alert_state(),
+        "anomalies": load_anomaly_state(),
+        "cube": load_cube(),
+        "index": index if index is not None and index.get("generation") == meta["generation"] else None,
+    }
+
+def _write_snapshot_file(snap, snapshot_file, journal_file, lock):
+    """Pickle a snapshot payload and trim the journal. Paths and lock are explicit so it can run off-thread."""
+    tmp = snapshot_file.with_suffix(f".{threading.get_ident()}.tmp")   # one per writer; two sessions can race here
+    with open(tmp, "wb") as f:
+        pickle.dump(snap, f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+    with lock:
+        os.replace(tmp, snapshot_file)
+        compact_journal(snap["generation"], snap["last_id"], path=journal_file)
+
+def write_snapshot(frame, meta):
+    """Persist frame (with its Id column) + rollups + search index, then trim the journal."""
+    _write_snapshot_file(_snapshot_payload(frame, meta), SNAPSHOT_FILE, JOURNAL_FILE, ledger_lock())
+
+def snapshot_in_background(frame, meta):
+    """
+    write_snapshot on a thread. The payload and paths are taken now: set_data_dir may point this
+    namespace at another user (the alert batch, a re-login) before the thread gets to write.
+    """
+    holder = _snapshot_holder(str(SNAPSHOT_FILE.resolve()))
+    if holder["running"]:
+        return
+    holder["running"] = True
+    try:
+        args = (_snapshot_payload(frame, meta), SNAPSHOT_FILE, JOURNAL_FILE, ledger_lock())
+    except BaseException:
+        holder["running"] = False
+        raise
+
+    def run():
+        try:
+            _write_snapshot_file(*args)
+        finally:
+            holder["running"] = False
+
+    threading.Thread(target=run, daemon=True).start()
+
+def maybe_snapshot():
+    """Kick off a background snapshot once enough has been journaled since the last one."""
+    if JOURNAL_FILE.exists() and JOURNAL_FILE.stat().st_size > SNAPSHOT_JOURNAL_BYTES:
+        with ledger_lock():
+            cols, meta = open_ledger()
+            frame = load_expense_frame(cols, meta)
+        snapshot_in_background(frame, meta)
+
+def _snapshot_current(snap, meta):
+    """Same generation and no in-place rewrite (edit/delete) since the snapshot was taken."""
+    return snap is not None and snap["generation"] == meta["generation"] and snap.get("revision") == meta.get("revision")
+
+def load_expense_frame(cols=None, meta=None):
+    """
+    All expenses (typed, with their ledger Id) as of now: the snapshot frame plus journal rows
+    written after it, minus anything deleted since. Falls back to parsing the CSV (and then
+    snapshots in the background) when there's no snapshot for this ledger generation.
+    """
+    if cols is None:
+        cols, meta = open_ledger()
+    snap = load_snapshot()
+    if _snapshot_current(snap, meta):
+        frame = snap["frame"].copy()   # the cached frame is shared by every session; never hand it out
+        tail = read_journal(meta["generation"], after_id=snap["last_id"])
+        if tail:
+            tail_df = pd.DataFrame(tail)
+            tail_frame = _typed_expenses(tail_df)
+            tail_frame.insert(0, "Id", tail_df["Id"].to_numpy(dtype=np.int64))
+            frame = pd.concat([frame, tail_frame], ignore_index=True)
+        if len(frame) != meta["rows"]:
+            frame = frame[frame["Id"].isin(np.asarray(cols["id"]))].reset_index(drop=True)
+        if len(frame) == meta["rows"]:
+            return frame
+    frame = _typed_expenses(_parse_expenses_csv()).reset_index(drop=True)
+    frame.insert(0, "Id", np.asarray(cols["id"])[:len(frame)])
+    snapshot_in_background(frame, meta)
+    return frame
+
+def _trim_torn_journal():
+    """Cut a half-written last journal line so the next append starts on a fresh line."""
+    if not JOURNAL_FILE.exists() or JOURNAL_FILE.stat().st_size == 0:
+        return
+    with open(JOURNAL_FILE, "r+b") as f:
+        data = f.read()
+        if not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+
+def _restore_rollups_from_snapshot(meta):
+    snap = load_snapshot()
+    if not _snapshot_current(snap, meta):
+        return
+    if load_alert_state() is None and snap.get("alerts"):
+        write_json_atomic(ALERT_STATE_FILE, snap["alerts"])
+    if load_anomaly_state() is None and snap.get("anomalies"):
+        write_json_atomic(ANOMALY_STATE_FILE, snap["anomalies"])
+    if load_cube() is None and snap.get("cube"):
+        save_cube(snap["cube"])
+    if not SEARCH_INDEX_FILE.exists() and snap.get("index"):
+        _save_search_index(snap["index"])
+
+def recover_ledger():
+    """
+    Finish an append that crashed half way: trim the CSV back to the last committed size and
+    commit the journaled rows again. A rewrite that crashed is simply dropped (the CSV is only
+    ever swapped in whole). Also puts back rollup/index files missing since the snapshot.
+    """
+    with ledger_lock():
+        _expenses_tmp_file().unlink(missing_ok=True)   # a rewrite that crashed before its swap
+        _trim_torn_journal()
+        meta = load_ledger_meta()
+        if meta is None or meta.get("version") != LEDGER_VERSION:
+            return
+        pending = read_journal(meta["generation"], after_id=meta["next_id"] - 1)
+        if pending and meta["csv_bytes"] is not None and EXPENSES_FILE.stat().st_size >= meta["csv_bytes"]:
+            with open(EXPENSES_FILE, "r+b") as f:
+                f.truncate(meta["csv_bytes"])
+            _commit_rows(_clean_text_fields(pd.DataFrame(pending)))
+        _restore_rollups_from_snapshot(meta)
+
+# ---------------------
+# Paged manager
+# ---------------------
+# Newest-first keyset pagination over the ledger columns: the cursor is (date ordinal, id) of
+# the last row shown, and only the rows of the requested page are read back from the CSV.
+MANAGER_PAGE_SIZE = 20
+EDITABLE_EXPENSE_COLUMNS = ["Date", "Category", "Amount", "PaymentType", "Notes", "IsRecurring"]
+
+def expense_page(before=None, page_size=MANAGER_PAGE_SIZE):
+    """
+    Page of expenses strictly older than the `before` cursor, newest first.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    cols, meta = open_ledger()
+    key = (np.asarray(cols["date"], dtype=np.int64) << 40) | np.asarray(cols["id"])
+    if before is not None:
+        cand = np.flatnonzero(key < ((int(before[0]) << 40) | int(before[1])))
+    else:
+        cand = np.arange(meta["rows"])
+    older = len(cand)
+    if older > page_size:
+        cand = cand[np.argpartition(key[cand], older - page_size)[older - page_size:]]
+    cand = cand[np.argsort(key[cand])[::-1]]
+    next_cursor = None
+    if older > page_size:
+        next_cursor = (int(cols["date"][cand[-1]]), int(cols["id"][cand[-1]]))
+    return read_expense_rows(cand), next_cursor
+
+def update_expenses(edited):
+    """
+    Apply inline edits (rows keyed by Id) in place, keeping every ID and the generation: only the
+    edited CSV rows are rewritten, rollups are patched for them and only rows whose text changed
+    are re-indexed.
+    """
+    if edited.empty:
+        return 0
+    with ledger_lock():
+        cols, meta = open_ledger()
+        ids = np.asarray(cols["id"])
+        wanted = edited["Id"].to_numpy(dtype=np.int64)
+        at = np.minimum(np.searchsorted(ids, wanted), max(len(ids) - 1, 0))
+        found = (ids[at] == wanted) if len(ids) else np.zeros(len(wanted), dtype=bool)
+        if not found.any():
+            return 0
+        positions = at[found]
+        before = read_expense_rows(positions)
+        after = before.copy()
+        for col in EDITABLE_EXPENSE_COLUMNS:
+            after[col] = edited.loc[found, col].to_numpy()
+        # the cached snapshot can be patched too, which saves the next load a full CSV parse
+        frame = load_expense_frame(cols, meta) if _snapshot_current(load_snapshot(), meta) else None
+        old = ledger_copy()
+        new_meta = rewrite_expense_rows(positions, after.drop(columns="Id"))
+        update_cube_after_rewrite(*old)
+        update_alert_totals_after_rewrite(*old)
+        check_alerts()
+        text_cols = ["Notes", "Category", "PaymentType"]
+        retext = _changed_rows(before, after, text_cols).index
+        if len(retext):
+            patch_search_index(before.iloc[retext], after.iloc[retext])
+    if frame is not None:
+        typed = _typed_expenses(after)
+        for col in EDITABLE_EXPENSE_COLUMNS:
+            frame.loc[positions, col] = typed[col].to_numpy()
+        snapshot_in_background(frame, new_meta)
+    return int(found.sum())
+
+def _changed_rows(before, after, columns):
+    """Rows of `after` whose editable cells differ from `before` (same index)."""
+    def as_text(df):
+        df = df[columns].astype(object)
+        return df.where(df.notna(), "").astype(str)
+    return after[(as_text(after) != as_text(before.loc[after.index])).any(axis=1)]
+
+def recurring_page(rec_df, page, page_size=MANAGER_PAGE_SIZE):
+    """One page of recurring rules, newest start date first (index kept for save/delete)."""
+    ordered = rec_df.sort_values("StartDate", ascending=False, kind="stable")
+    return ordered.iloc[page * page_size:(page + 1) * page_size]
+
 # ---------------------
 # Recurring handling
 # ---------------------
@@ -362,7 +1844,7 @@ def generate_virtual_recurring_for_month(rec_df, year, month):
         day = int(row.get("DayOfMonth", pd.to_datetime(row["StartDate"]).day))
         # clamp day to days in month
         last_day = calendar.monthrange(year, month)[1]
-        day = min(day, last_day)
+        day = min(max(day, 1), last_day)   # rules saved before the editor enforced 1-28
         dt = date(year, month, day)
         generated.append({
             "Date": dt,
@@ -376,13 +1858,12 @@ def generate_virtual_recurring_for_month(rec_df, year, month):
     if generated:
         return pd.DataFrame(generated)
     else:
-        return pd.DataFrame(columns=["Date","Category","Amount","PaymentType","Notes","IsRecurring","CreatedAt"])
+        return pd.DataFrame(columns=EXPENSE_COLUMNS)
 
 def persist_recurring_for_month(rec_df, year, month):
     """Persist recurring entries for this month (mark LastApplied) to avoid duplicates."""
     today_key = f"{year}-{month:02d}"
-    # load expenses and persist only those that have not been applied this month
-    ex = load_expenses()
+    # persist only those that have not been applied this month
     to_add = []
     for i, row in rec_df.iterrows():
         last = row.get("LastApplied", "")
@@ -390,7 +1871,7 @@ def persist_recurring_for_month(rec_df, year, month):
             continue
         day = int(row.get("DayOfMonth", pd.to_datetime(row["StartDate"]).day))
         last_day = calendar.monthrange(year, month)[1]
-        day = min(day, last_day)
+        day = min(max(day, 1), last_day)   # rules saved before the editor enforced 1-28
         dt = date(year, month, day)
         to_add.append({
             "Date": dt,
@@ -404,20 +1885,27 @@ def persist_recurring_for_month(rec_df, year, month):
         # update last applied
         rec_df.at[i,"LastApplied"] = today_key
     if to_add:
-        pd.DataFrame(to_add).to_csv(EXPENSES_FILE, mode='a', header=False, index=False)
+        append_expense_rows(pd.DataFrame(to_add))
         save_recurring(rec_df)
     return len(to_add)
 
 # ---------------------
 # Forecasting utilities
 # ---------------------
-def daily_totals(expenses_df, year, month):
-    """Return a Series indexed by date for every day from 1..today (or full month if needed)."""
-    if expenses_df is None or expenses_df.empty:
+def daily_totals(expenses_df, year, month, include_recurring=True):
+    """
+    Return a Series indexed by date for every day from 1..today (or full month if needed).
+    Pass expenses_df=None to aggregate straight from the columnar ledger.
+    """
+    if expenses_df is None:
+        return ledger_daily_totals(year, month, include_recurring)
+    if expenses_df.empty:
         return pd.Series(dtype=float)
     # Filter to this month
     df = expenses_df.copy()
     df = df[df["Date"].apply(lambda d: d.year==year and d.month==month)]
+    if not include_recurring:
+        df = df[~df["IsRecurring"].astype(bool)]
     if df.empty:
         return pd.Series(dtype=float)
     df2 = df.groupby("Date")["Amount"].sum().sort_index()
@@ -430,12 +1918,13 @@ def daily_totals(expenses_df, year, month):
         s[d] = v
     return s
 
-def forecast_month(expenses_df, year, month, threshold_days=10):
+def forecast_month(expenses_df, year, month, threshold_days=10, include_recurring=True):
     """
     Forecast total spend for the month.
+    - include_recurring=False forecasts day-to-day spend only (a rent row on the 1st skews the trend)
     - returns dict: {'status': 'not_enough_data'/'linear'/'prophet'/'sarimax', 'predicted_total': x, 'model': name}
     """
-    s = daily_totals(expenses_df, year, month)
+    s = daily_totals(expenses_df, year, month, include_recurring)
     if len(s.dropna()) == 0:
         return {"status":"no_data"}
     days_in_month = calendar.monthrange(year,month)[1]
@@ -501,6 +1990,102 @@ def forecast_month(expenses_df, year, month, threshold_days=10):
     except Exception as e:
         return {"status":"error", "error": str(e)}
 
+# ---------------------
+# Scenario simulation
+# ---------------------
+# Monte Carlo "what if" for a month's total: spend already logged + the month's recurring
+# rules still to come (as the scenario changes them) + remaining days drawn from the last
+# SIM_HISTORY_DAYS of day-by-day discretionary spend. forecast_month over the same non-recurring
+# spend sets the expected level of the remaining days; the history supplies their spread. A scenario is a dict like
+#   {"cuts": {"Food": 20}, "extra": {"Rent": 15000}, "cancel": ["Netflix", "Spotify"]}
+# (cuts in %, extra in ₹ per month, cancel = recurring rule names).
+SIM_PATHS = 5000
+SIM_HISTORY_DAYS = 90
+
+def _daily_category_spend(cols, meta, first_ord, last_ord):
+    """(days x categories) non-recurring spend in ₹ for date ordinals first_ord..last_ord."""
+    n_days = max(last_ord - first_ord + 1, 0)
+    n_cats = max(len(meta["categories"]), 1)
+    ords = np.asarray(cols["date"], dtype=np.int64)
+    keep = (ords >= first_ord) & (ords <= last_ord) & ((np.asarray(cols["flags"]) & FLAG_RECURRING) == 0)
+    cells = (ords[keep] - first_ord) * n_cats + np.asarray(cols["category"])[keep]
+    spend = np.bincount(cells, weights=np.asarray(cols["amount"])[keep], minlength=n_days * n_cats)
+    return spend.reshape(n_days, n_cats) / 100.0
+
+def _logged_recurring(cols, meta, first_ord, last_ord):
+    """₹ per recurring rule name already logged as recurring rows between the two date ordinals."""
+    ords = np.asarray(cols["date"], dtype=np.int64)
+    pos = np.flatnonzero((ords >= first_ord) & (ords <= last_ord) & ((np.asarray(cols["flags"]) & FLAG_RECURRING) != 0))
+    if not len(pos):
+        return {}
+    rows = read_expense_rows(pos)
+    names = rows["Notes"].fillna("").astype(str).str.replace(r"^Recurring: ", "", regex=True)
+    return rows["Amount"].groupby(names).sum().to_dict()
+
+def scenario_recurring_total(rec_df, scenario, month_key=None, logged=None):
+    """
+    Recurring charges still to come in the month after the scenario's cancellations, plus its extra
+    costs. Weekly rules cost 52/12 of their amount a month; a rule already applied this month
+    (LastApplied == month_key) only adds what its logged row doesn't cover.
+    """
+    total = 0.0
+    if rec_df is not None and not rec_df.empty:
+        kept = rec_df[~rec_df["Name"].isin(scenario.get("cancel", []))]
+        amounts = pd.to_numeric(kept["Amount"], errors="coerce").fillna(0.0)
+        monthly = amounts.where(kept["Frequency"] != "Weekly", amounts * 52 / 12)
+        applied = kept["LastApplied"].fillna("").astype(str) == (month_key or "")
+        done = kept["Name"].map(logged or {}).fillna(0.0).where(applied, 0.0)
+        total = float((monthly - done).clip(lower=0.0).sum())
+    return total + float(sum((scenario.get("extra") or {}).values()))
+
+def simulate_month(year, month, scenario=None, n_paths=SIM_PATHS, forecast=None, rec_df=None, today=None, seed=0):
+    """
+    Simulate n_paths end-of-month totals. Returns the totals array plus its summary; days
+    already gone are taken as logged, so a past month has no spread at all.
+    """
+    scenario = scenario or {}
+    today = today or date.today()
+    cols, meta = open_ledger()
+    days_in_month = calendar.monthrange(year, month)[1]
+    first = date(year, month, 1).toordinal()
+    elapsed = int(np.clip(today.toordinal() - first + 1, 0, days_in_month))
+    remaining = days_in_month - elapsed
+
+    logged = _logged_recurring(cols, meta, first, first + elapsed - 1)
+    observed = float(_daily_category_spend(cols, meta, first, first + elapsed - 1).sum()) + sum(logged.values())
+    history = _daily_category_spend(cols, meta, today.toordinal() - SIM_HISTORY_DAYS + 1, today.toordinal())
+    keep_share = np.ones(history.shape[1])
+    for cat, pct in (scenario.get("cuts") or {}).items():
+        if cat in meta["categories"]:
+            keep_share[meta["categories"].index(cat)] = 1 - float(pct) / 100.0
+    day_totals = history @ keep_share
+
+    # scale history so an uncut path averages what the (non-recurring) forecast expects for the
+    # remaining days; a forecast of nothing more to spend is degenerate, so keep the history as is
+    scale = 1.0
+    base_rate = history.sum(axis=1).mean()
+    if forecast and forecast.get("status") == "ok" and remaining and base_rate > 0:
+        expected = forecast["predicted_total"] - forecast["total_so_far"]
+        if expected > 0:
+            scale = expected / remaining / base_rate
+
+    rng = np.random.default_rng(seed)
+    future = day_totals[rng.integers(0, len(day_totals), size=(n_paths, remaining))].sum(axis=1) * scale
+    recurring = scenario_recurring_total(rec_df, scenario, f"{year}-{month:02d}", logged)
+    totals = observed + recurring + future
+    p5, p50, p95 = np.percentile(totals, [5, 50, 95])
+    return {"totals": totals, "mean": float(totals.mean()), "p5": float(p5), "p50": float(p50), "p95": float(p95),
+            "observed": observed, "recurring": recurring, "days_left": remaining}
+
+def scenario_outlook(totals, budget=None, income=None, savings_goal=None):
+    """Chance of going over the monthly budget and of missing the savings goal."""
+    out = {"p_over_budget": None, "p_miss_savings": None}
+    if budget:
+        out["p_over_budget"] = float((totals > float(budget)).mean())
+    if income and savings_goal:
+        out["p_miss_savings"] = float((float(income) - totals < float(savings_goal)).mean())
+    return out
+
 # ---------------------
 # Google Sheets sync (optional)
 # ---------------------
@@ -533,47 +2118,439 @@ def gsheets_append_row(sheet_name, row_dict):
     ws.append_row(vals)
     return True
 
+# ---------------------
+# Statement ingestion
+# ---------------------
+# The parsers live in statement_parsers.py; files are parsed one after another and everything
+# they produce goes into the ledger as a single bulk append. There is no worker pool: forking the
+# multi-threaded server can deadlock, spawned workers re-run its __main__, and the parsers' pandas
+# string/regex work holds the GIL, so threads measured no faster (4 x 200k-row CSVs: 4.2 s in turn,
+# 4.5 s on 4 threads).
+
+def load_bank_profiles():
+    """Column-mapping profiles learned so far, keyed by each bank CSV's header fingerprint."""
+    return read_json(BANK_PROFILES_FILE) or {}
+
+def parse_statements(files):
+    """Parse [(name, bytes), ...] and remember any new bank CSV layouts."""
+    profiles = load_bank_profiles()
+    results = [statement_parsers.parse_statement(name, data, profiles) for name, data in files]
+    learned = {r["fingerprint"]: r["profile"] for r in results
+               if r["fingerprint"] and r["profile"] and r["fingerprint"] not in profiles}
+    if learned:
+        profiles.update(learned)
+        write_json_atomic(BANK_PROFILES_FILE, profiles)
+    return results
+
+def ingest_statements(files):
+    """Parse statements and append every file's rows to the ledger in one write. Returns (results, report)."""
+    results = parse_statements(files)
+    frames = [r["rows"] for r in results if r["rows"] is not None and len(r["rows"])]
+    if not frames:
+        return results, None
+    rows = pd.concat(frames, ignore_index=True)
+    rows["CreatedAt"] = datetime.now()
+    return results, append_expense_rows(rows)
+
+# ---------------------
+# Streaming exports
+# ---------------------
+EXPORT_CHUNK_ROWS = 50_000
+EXPORT_BACKGROUND_BYTES = 20 * 1024 * 1024   # ledgers bigger than this are exported off the UI thread
+EXPORT_TMP_PREFIX = "expenses_export_"
+EXPORT_TMP_MAX_AGE = 6 * 3600   # seconds; older export temp files belong to sessions that went away
+EXCEL_MAX_ROWS = 1_048_575                   # Excel sheet limit minus the header row
+EXPORT_FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/octet-stream"),
+    "Excel": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+def available_export_formats():
+    formats = ["CSV"]
+    if PYARROW_AVAILABLE:
+        formats.append("Parquet")
+    if OPENPYXL_AVAILABLE:
+        formats.append("Excel")
+    return formats
+
+def iter_expense_chunks(start=None, end=None, categories=None, chunksize=EXPORT_CHUNK_ROWS, source=None):
+    """
+    Yield expense chunks straight from disk. The date range and categories are matched on the
+    ledger columns, so a block of rows with no match is never read and only matching lines are parsed.
+    `source` is (cols, meta, open CSV file) when the caller pinned a ledger version (see start_export).
+    """
+    if source is None:
+        cols, meta = open_ledger()
+        with open(EXPENSES_FILE, "rb") as f:
+            yield from iter_expense_chunks(start, end, categories, chunksize, (cols, meta, f))
+        return
+    cols, meta, f = source
+    n = meta["rows"]
+    mask = np.ones(n, dtype=bool)
+    dates = np.asarray(cols["date"])
+    if start is not None or end is not None:
+        mask &= dates > 0   # dates the ledger couldn't parse never match a range
+    if start is not None:
+        mask &= dates >= pd.Timestamp(start).toordinal()
+    if end is not None:
+        mask &= dates <= pd.Timestamp(end).toordinal()
+    if categories:
+        codes = [i for i, label in enumerate(meta["categories"]) if label in set(categories)]
+        mask &= np.isin(np.asarray(cols["category"]), codes)
+    offsets = np.asarray(cols["offset"])
+    ends = np.append(offsets[1:], meta["csv_bytes"])
+    for lo in range(0, n, chunksize):
+        hi = min(lo + chunksize, n)
+        picked = np.flatnonzero(mask[lo:hi]) + lo
+        if not len(picked):
+            continue
+        f.seek(int(offsets[lo]))
+        block = f.read(int(ends[hi - 1] - offsets[lo]))
+        if len(picked) < hi - lo:
+            base = offsets[lo]
+            block = b"".join(block[offsets[p] - base:ends[p] - base] for p in picked)
+        yield pd.read_csv(io.BytesIO(block), header=None, names=EXPENSE_COLUMNS)
+
+def _typed_export_chunk(chunk):
+    """Give every chunk the same column types so Parquet/Excel writers see one schema."""
+    out = chunk.reindex(columns=EXPENSE_COLUMNS).copy()
+    out["Date"] = pd.to_datetime(out["Date"], errors="coerce")
+    out["Amount"] = pd.to_numeric(out["Amount"], errors="coerce").fillna(0.0).astype(float)
+    out["IsRecurring"] = _truthy(out["IsRecurring"])
+    for col in ["Category", "PaymentType", "Notes", "CreatedAt"]:
+        out[col] = out[col].fillna("").astype(str)
+    return out
+
+def _write_csv_export(path, chunks):
+    rows = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        header = True
+        for chunk in chunks:
+            chunk.to_csv(f, index=False, header=header)
+            header = False
+            rows += len(chunk)
+        if header:
+            f.write(",".join(EXPENSE_COLUMNS) + "\n")
+    return rows
+
+def _write_parquet_export(path, chunks):
+    rows = 0
+    schema = pa.schema([
+        ("Date", pa.timestamp("ns")),
+        ("Category", pa.string()),
+        ("Amount", pa.float64()),
+        ("PaymentType", pa.string()),
+        ("Notes", pa.string()),
+        ("IsRecurring", pa.bool_()),
+        ("CreatedAt", pa.string()),
+    ])
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(_typed_export_chunk(chunk), schema=schema, preserve_index=False)
+            writer.write_table(table)
+            rows += len(chunk)
+    return rows
+
+def _write_excel_export(path, chunks):
+    rows = 0
+    wb = Workbook(write_only=True)
+    ws = None
+    sheet_rows = EXCEL_MAX_ROWS
+    for chunk in chunks:
+        typed = _typed_export_chunk(chunk)
+        typed["Date"] = typed["Date"].dt.date
+        for values in typed.itertuples(index=False, name=None):
+            if sheet_rows >= EXCEL_MAX_ROWS:
+                ws = wb.create_sheet(f"Expenses {len(wb.worksheets) + 1}")
+                ws.append(EXPENSE_COLUMNS)
+                sheet_rows = 0
+            ws.append([None if pd.isna(v) else v for v in values])
+            sheet_rows += 1
+        rows += len(chunk)
+    if ws is None:
+        wb.create_sheet("Expenses 1").append(EXPENSE_COLUMNS)
+    wb.save(path)
+    return rows
+
+def write_export(path, fmt, start=None, end=None, categories=None, source=None):
+    """Stream filtered expenses into `path` as CSV/Parquet/Excel. Returns number of rows written."""
+    chunks = iter_expense_chunks(start, end, categories, source=source)
+    if fmt == "Parquet":
+        if not PYARROW_AVAILABLE:
+            raise RuntimeError("pyarrow not installed; Parquet export unavailable")
+        return _write_parquet_export(path, chunks)
+    if fmt == "Excel":
+        if not OPENPYXL_AVAILABLE:
+            raise RuntimeError("openpyxl not installed; Excel export unavailable")
+        return _write_excel_export(path, chunks)
+    return _write_csv_export(path, chunks)
+
+def start_export(fmt, start=None, end=None, categories=None):
+    """
+    Export into a temp file and return a job dict.
+    Big ledgers are written on a background thread; poll job['done'] before offering the download.
+    """
+    sweep_stale_exports()
+    ext, _ = EXPORT_FORMATS[fmt]
+    fd, tmp_path = tempfile.mkstemp(prefix=EXPORT_TMP_PREFIX, suffix=f".{ext}")
+    os.close(fd)
+    job = {"path": tmp_path, "format": fmt, "done": False, "rows": 0, "error": None, "discarded": False,
+           "served": False}
+    # pin this ledger version now: the thread must not follow set_data_dir to another user, and an
+    # open handle keeps reading this CSV even if a rewrite swaps in a new file meanwhile
+    cols, meta = open_ledger()
+    csv_file = open(EXPENSES_FILE, "rb")
+
+    def run():
+        try:
+            job["rows"] = write_export(tmp_path, fmt, start, end, categories, source=(cols, meta, csv_file))
+        except Exception as e:
+            job["error"] = str(e)
+        finally:
+            csv_file.close()
+            job["done"] = True
+            if job["discarded"] or job["error"]:
+                _remove_export_file(job)
+
+    if meta["csv_bytes"] > EXPORT_BACKGROUND_BYTES:
+        threading.Thread(target=run, daemon=True).start()
+    else:
+        run()
+    return job
+
+def _remove_export_file(job):
+    try:
+        os.remove(job["path"])
+    except OSError:
+        pass
+
+def discard_export(job):
+    """Drop a job's temp file. A job still being written is flagged and its thread removes the file when done."""
+    if not job:
+        return
+    job["discarded"] = True
+    if job["done"]:
+        _remove_export_file(job)
+
+def export_download(job):
+    """
+    Deferred data for st.download_button: the file is read only when the user clicks (on a
+    Streamlit worker thread) and deleted once served, so no session keeps a copy of the export.
+    """
+    def read():
+        with open(job["path"], "rb") as f:
+            data = f.read()
+        job["served"] = True
+        discard_export(job)
+        return data
+    return read
+
+def sweep_stale_exports(max_age=EXPORT_TMP_MAX_AGE):
+    """Remove export temp files left behind by sessions that ended before their download was served."""
+    cutoff = datetime.now().timestamp() - max_age
+    for path in Path(tempfile.gettempdir()).glob(f"{EXPORT_TMP_PREFIX}*"):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+        except OSError:
+            pass
+
+def show_export_job(state_key, file_stem):
+    """Render the status / download button for an export job kept in session_state."""
+    job = st.session_state.get(state_key)
+    if not job:
+        return
+    if not job["done"]:
+        st.info("⏳ Still packing your export in the background...")
+        if st.button("Check again", key=f"{state_key}_refresh"):
+            st.rerun()
+        return
+    if job["error"]:
+        st.error("Export failed: " + job["error"])
+        return
+    if job["served"]:
+        st.session_state.pop(state_key, None)
+        st.caption(f"✅ {job['format']} export downloaded.")
+        return
+    ext, mime = EXPORT_FORMATS[job["format"]]
+    # on_click="ignore": a rerun would replace the button and revoke the deferred download mid-click
+    st.download_button(f"Download {job['format']} ({job['rows']} rows)", export_download(job),
+                       file_name=f"{file_stem}.{ext}", mime=mime, key=f"{state_key}_download", on_click="ignore")
+
+# ---------------------
+# Accounts
+# ---------------------
+# Every account gets its own directory (ledger, recurring rules, settings, indexes, alerts)
+# under data/users/<name>/. The original single-password ledger in data/ is moved into
+# data/users/DEFAULT_USER/ the first time accounts are loaded.
+ACCOUNTS_FILE = ROOT_DATA_DIR / "users.json"
+DEFAULT_USER = "babo"
+APP_PASSWORD = "anniversary17"   # <- password for the original (DEFAULT_USER) ledger
+_PBKDF2_ROUNDS = 200_000
+
+def _hash_password(password, salt):
+    return hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), bytes.fromhex(salt), _PBKDF2_ROUNDS).hex()
+
+# Everything set_data_dir points at, relative to a user's directory
+USER_DATA_FILES = ["expenses.csv", "recurring.csv", "settings.json", "ledger", "search_index.pkl",
+                   "anomaly_stats.json", "alert_state.json", "alerts_outbox.jsonl", "snapshot.pkl",
+                   "journal.jsonl", "bank_profiles.json", "cube.json"]
+
+def _migrate_default_ledger(accounts):
+    """Move the pre-accounts ledger from data/ into data/users/DEFAULT_USER/ and repoint the account."""
+    target = USERS_DIR / DEFAULT_USER
+    target.mkdir(parents=True, exist_ok=True)
+    with _ledger_lock(str(ROOT_DATA_DIR.resolve())):
+        for name in USER_DATA_FILES:
+            src = ROOT_DATA_DIR / name
+            if src.exists() and not (target / name).exists():
+                os.replace(src, target / name)
+    accounts[DEFAULT_USER]["dir"] = f"users/{DEFAULT_USER}"
+    write_json_atomic(ACCOUNTS_FILE, accounts)
+
+def load_accounts():
+    accounts = read_json(ACCOUNTS_FILE)
+    if accounts is None:
+        ROOT_DATA_DIR.mkdir(parents=True, exist_ok=True)
+        salt = secrets.token_hex(16)
+        # whatever is already in data/ is the default user's ledger; it's moved just below
+        accounts = {DEFAULT_USER: {"salt": salt, "hash": _hash_password(APP_PASSWORD, salt), "dir": "."}}
+    if accounts.get(DEFAULT_USER, {}).get("dir") == ".":
+        _migrate_default_ledger(accounts)
+    return accounts
+
+def create_account(username, password):
+    """Register a new user with an empty ledger. Raises ValueError for bad or taken names."""
+    username = username.strip().lower()
+    if not re.fullmatch(r"[a-z0-9_-]{3,32}", username):
+        raise ValueError("Username must be 3-32 characters: letters, digits, - or _")
+    if len(password) < 6:
+        raise ValueError("Password must be at least 6 characters")
+    with _ledger_lock(str(ACCOUNTS_FILE.resolve())):
+        accounts = load_accounts()
+        if username in accounts:
+            raise ValueError("That username is taken")
+        salt = secrets.token_hex(16)
+        accounts[username] = {"salt": salt, "hash": _hash_password(password, salt), "dir": f"users/{username}"}
+        write_json_atomic(ACCOUNTS_FILE, accounts)
+    return user_data_dir(username, accounts)
+
+def user_data_dir(username, accounts=None):
+    accounts = accounts or load_accounts()
+    return ROOT_DATA_DIR / accounts[username]["dir"]
+
+def authenticate(username, password):
+    """Return the user's data directory if the password matches, else None."""
+    username = username.strip().lower()
+    account = load_accounts().get(username)
+    if account is None:
+        return None
+    if not hmac.compare_digest(account["hash"], _hash_password(password, account["salt"])):
+        return None
+    return user_data_dir(username)
+
+@st.cache_data(ttl=600, show_spinner=False)
+def cached_forecast(data_dir, generation, revision, rows, csv_bytes, year, month, threshold_days=10,
+                    include_recurring=True):
+    """forecast_month for the current user, cached per user and ledger version so Prophet fits once per change."""
+    return forecast_month(None, year, month, threshold_days=threshold_days, include_recurring=include_recurring)
+
+@st.cache_data(ttl=600, show_spinner=False, max_entries=64)
+def cached_scenario(data_dir, generation, revision, rows, csv_bytes, recurring_mtime, year, month, scenario,
+                    budget=None, income=None, savings_goal=None, n_paths=SIM_PATHS):
+    """simulate_month + outlook, cached per user, ledger version and scenario so slider moves are instant."""
+    fc = cached_forecast(data_dir, generation, revision, rows, csv_bytes, year, month, threshold_days=10,
+                         include_recurring=False)
+    sim = simulate_month(year, month, scenario, n_paths, forecast=fc, rec_df=load_recurring())
+    sim.update(scenario_outlook(sim["totals"], budget, income, savings_goal))
+    return sim
+
 # ---------------------
 # UI / App
 # ---------------------
+# Headless alert check, e.g. from cron: `python app.py --check-alerts [data_dir ...]`
+if __name__ == "__main__" and "--check-alerts" in sys.argv:
+    batch_dirs = [Path(a) for a in sys.argv[sys.argv.index("--check-alerts") + 1:]]
+    for checked_dir, n_alerts in run_alert_batch(batch_dirs).items():
+        print(f"{checked_dir}: {n_alerts} new alert(s)")
+    for t in threading.enumerate():   # let background snapshot writers finish before exiting
+        if t is not threading.current_thread():
+            t.join()
+    sys.exit(0)
+
 st.set_page_config(page_title="Babo's Smart Expense Predictor", page_icon="💸", layout="wide")
 
 # Apply custom styling
 apply_custom_styling()
 
-ensure_files()
-settings = load_settings()
-
 # Fun animated title
 st.markdown('<h1 class="main-title">💸✨ Babo\'s Magical Money Tracker ✨💸</h1>', unsafe_allow_html=True)
 
-APP_PASSWORD = "anniversary17"   # <- set your password here
-
 if "authenticated" not in st.session_state:
     st.session_state["authenticated"] = False
-if not st.session_state["authenticated"]:
-    pwd = st.text_input("Enter app password", type="password")
-    if st.button("Login"):
-        if pwd == APP_PASSWORD:
-            st.session_state["authenticated"] = True
-            st.rerun()   # ✅ new function in latest Streamlit
-        else:
-            st.error("Wrong password.")
+if not st.session_state["authenticated"] or "user" not in st.session_state:
+    login_tab, signup_tab = st.tabs(["Login", "Create account"])
+    with login_tab:
+        uname = st.text_input("Username", value=DEFAULT_USER)
+        pwd = st.text_input("Enter app password", type="password")
+        if st.button("Login"):
+            user_dir = authenticate(uname, pwd)
+            if user_dir is not None:
+                st.session_state["authenticated"] = True
+                st.session_state["user"] = uname.strip().lower()
+                st.rerun()   # ✅ new function in latest Streamlit
+            else:
+                st.error("Wrong username or password.")
+    with signup_tab:
+        new_uname = st.text_input("Pick a username")
+        new_pwd = st.text_input("Pick a password", type="password")
+        new_pwd2 = st.text_input("Repeat password", type="password")
+        if st.button("Create account"):
+            if new_pwd != new_pwd2:
+                st.error("Passwords don't match.")
+            else:
+                try:
+                    create_account(new_uname, new_pwd)
+                    st.success("🎉 Account created! Log in from the first tab.")
+                except ValueError as e:
+                    st.error(str(e))
     st.stop()
 
+# Everything below reads and writes only this user's directory
+set_data_dir(user_data_dir(st.session_state["user"]))
+ensure_files()
+settings = load_settings()
+
 
 # Sidebar: settings
 with st.sidebar:
+    st.caption(f"Logged in as **{st.session_state['user']}**")
+    if st.button("Log out"):
+        for k in ["authenticated", "user"]:
+            st.session_state.pop(k, None)
+        st.rerun()
     st.markdown("#### ⚙️ Magic Settings ✨")
     monthly_budget = st.number_input("Set monthly budget (₹)", min_value=0.0, value=settings.get("monthly_budget") or 0.0, step=100.0)
     monthly_income = st.number_input("Set monthly income (₹)", min_value=0.0, value=settings.get("monthly_income") or 0.0, step=500.0)
     savings_goal = st.number_input("Set monthly savings goal (₹)", min_value=0.0, value=settings.get("savings_goal") or 0.0, step=500.0)
+    weekly_budget = st.number_input("Weekly budget (₹, 0 = monthly ÷ weeks)", min_value=0.0, value=settings.get("weekly_budget") or 0.0, step=100.0)
+    with st.expander("Category limits (₹ per month)"):
+        old_limits = settings.get("category_limits") or {}
+        category_limits = {
+            c: st.number_input(c, min_value=0.0, value=float(old_limits.get(c) or 0.0), step=100.0, key=f"limit_{c}")
+            for c in CATEGORIES
+        }
     if st.button("Save settings"):
         settings["monthly_budget"] = float(monthly_budget) if monthly_budget>0 else None
         settings["monthly_income"] = float(monthly_income) if monthly_income>0 else None
         settings["savings_goal"] = float(savings_goal) if savings_goal>0 else None
+        settings["weekly_budget"] = float(weekly_budget) if weekly_budget>0 else None
+        settings["category_limits"] = {c: float(v) for c, v in category_limits.items() if v > 0}
         save_settings(settings)
         st.success("⚙️ Settings locked and loaded! 🚀")
+        for alert in check_alerts():
+            st.warning(alert["message"])
 
     st.markdown("---")
     st.markdown("#### 🔁 Monthly Money Vampires 🧛‍♂️")
@@ -586,10 +2563,16 @@ with st.sidebar:
 
     st.markdown("---")
     st.markdown("#### 💾 Save My Soul (Data) 😇")
-    if st.button("Export expenses CSV"):
-        df = load_expenses()
-        csv = df.to_csv(index=False).encode('utf-8')
-        st.download_button("Download CSV", csv, file_name="expenses_export.csv", mime="text/csv")
+    with st.form("export_form"):
+        exp_fmt = st.selectbox("Format", available_export_formats())
+        exp_range = st.date_input("Date range (optional)", value=())
+        exp_cats = st.multiselect("Categories (empty = all)", CATEGORIES)
+        if st.form_submit_button("Export expenses"):
+            exp_start = exp_range[0] if len(exp_range) > 0 else None
+            exp_end = exp_range[1] if len(exp_range) > 1 else exp_start
+            discard_export(st.session_state.get("sidebar_export"))
+            st.session_state["sidebar_export"] = start_export(exp_fmt, exp_start, exp_end, exp_cats)
+    show_export_job("sidebar_export", "expenses_export")
     st.caption("Enable Google Sheets sync in the app (main page) for cloud persistence.")
 
 # Main: expense entry
@@ -598,9 +2581,9 @@ with col1:
     st.markdown("### 🛍️ Oops, I Spent Money Again! 💸")
     with st.form("add_expense"):
         d = st.date_input("Date", value=date.today())
-        cat = st.selectbox("Category", ["Food","Shopping","Rent","Travel","Subscriptions","Utilities","Other"])
+        cat = st.selectbox("Category", CATEGORIES)
         amt = st.number_input("Amount (₹)", min_value=0.0, step=10.0, format="%.2f")
-        ptype = st.selectbox("Payment Type", ["Card","UPI","Cash","Recurring"])
+        ptype = st.selectbox("Payment Type", PAYMENT_TYPES)
         notes = st.text_input("Notes (optional)")
         is_rec = st.checkbox("Mark as recurring (ad-hoc)", value=False)
         submitted = st.form_submit_button("Add Expense")
@@ -621,8 +2604,9 @@ with col1:
                             "IsRecurring": bool(is_rec),
                             "CreatedAt": datetime.now()
                         }
-                        append_expense(row)
+                        report = append_expense(row)
                         st.success("💸 Another one bites the dust! Added successfully! 🎉")
+                        show_append_report(report)
                 else:
                     row = {
                         "Date": d,
@@ -633,8 +2617,9 @@ with col1:
                         "IsRecurring": bool(is_rec),
                         "CreatedAt": datetime.now()
                     }
-                    append_expense(row)
+                    report = append_expense(row)
                     st.success("💸 Another one bites the dust! Added successfully! 🎉")
+                    show_append_report(report)
                 # optional Google Sheets sync if configured
                 try:
                     if "gcp_service_account" in st.secrets and st.button("Sync this entry to Google Sheets (press once)"):
@@ -685,54 +2670,16 @@ with col2:
 st.markdown("---")
 # Dashboard
 st.markdown("### 📊 The Damage Report 😅")
-expenses = load_expenses()
 recurring = load_recurring()
 
-# show month summary
-# ---------- Safe metrics block (replace the old block with this) ----------
-from datetime import date as _date  # local alias to avoid shadowing if needed
-
-# --- The Damage Report 😅 ---
-
-# --- The Damage Report 😅 ---
-
-from datetime import date as _date  # alias
-
-if expenses is None:
-    expenses = pd.DataFrame()
-
-# Ensure Date is a date object
-if not expenses.empty and "Date" in expenses.columns:
-    try:
-        expenses["Date"] = pd.to_datetime(expenses["Date"]).dt.date
-    except Exception:
-        pass
-
-# Ensure Amount is numeric
-if not expenses.empty and "Amount" in expenses.columns:
-    expenses["Amount"] = pd.to_numeric(expenses["Amount"], errors="coerce").fillna(0.0)
-
-today_date = _date.today()
+# Metrics come straight from the columnar ledger, no CSV parsing
+today_date = date.today()
 year, month = today_date.year, today_date.month
-
-# Filter for this month
-if not expenses.empty and "Date" in expenses.columns:
-    this_month_expenses = expenses[
-        expenses["Date"].apply(
-            lambda d: (hasattr(d, "year") and d.year == year and d.month == month) if pd.notna(d) else False
-        )
-    ]
-else:
-    this_month_expenses = pd.DataFrame()
-
-# Compute totals safely as floats
-total_month = float(this_month_expenses["Amount"].sum()) if not this_month_expenses.empty else 0.0
-today_total = float(
-    this_month_expenses[this_month_expenses["Date"] == today_date]["Amount"].sum()
-) if not this_month_expenses.empty else 0.0
+month_summary = ledger_month_summary(year, month, today=today_date)
+total_month = month_summary["total"]
+today_total = month_summary["today_total"]
 budget_val = float(settings.get("monthly_budget") or 0.0)
 
-# Metrics (now guaranteed floats)
 c1, c2, c3 = st.columns(3)
 c1.metric("Today spent (₹)", f"{today_total:.2f}")
 c2.metric("This month so far (₹)", f"{total_month:.2f}")
@@ -740,13 +2687,13 @@ c3.metric("Budget (₹)", f"{budget_val:.2f}")
 
 
 # Category pie
-if not this_month_expenses.empty:
-    cat_df = this_month_expenses.groupby("Category")["Amount"].sum().reset_index()
+if month_summary["rows"] > 0:
+    cat_df = month_summary["categories"].rename_axis("Category").reset_index(name="Amount")
     fig1 = px.pie(cat_df, names="Category", values="Amount", title="Category split")
     st.plotly_chart(fig1, use_container_width=True)
 
 # daily trend
-s = daily_totals(expenses, year, month)
+s = daily_totals(None, year, month)
 if not s.empty:
     df_line = s.reset_index()
     df_line.columns = ["Date","Amount"]
@@ -755,9 +2702,47 @@ if not s.empty:
 else:
     st.info("No expenses logged for this month yet. Add some to see trends.")
 
+# Period-over-period comparisons, straight from the analytics cube
+st.markdown("### 📊 Then vs Now 🕰️")
+cube = update_cube()
+gc1, gc2 = st.columns(2)
+grain = gc1.radio("Compare by", ["month", "quarter", "year"], horizontal=True, format_func=str.title)
+dimension = gc2.radio("Movers by", list(CUBE_DIMENSIONS), horizontal=True, format_func=str.title)
+comparisons = period_comparisons(cube, date.today(), grain, dimension)
+mc1, mc2 = st.columns(2)
+for col, (label, cmp) in zip((mc1, mc2), [("vs previous", comparisons["previous"]),
+                                           ("vs last year", comparisons["last_year"])]):
+    delta = f"{cmp['pct']:+.0f}%" if cmp["pct"] is not None else None
+    col.metric(f"{cmp['current']} {label} ({cmp['previous']})", f"₹{cmp['total']:.0f}",
+               delta=delta, delta_color="inverse")
+    if cmp["movers"]:
+        col.dataframe(pd.DataFrame(cmp["movers"]), hide_index=True, use_container_width=True)
+
+# Budget alerts fired at write time (or by the headless checker) that haven't been dismissed
+open_alerts = pending_alerts()
+if open_alerts:
+    st.markdown("### 📣 Heads Up! 📣")
+    for alert in open_alerts[-10:]:
+        st.warning(f"{alert['message']} _({alert['created']})_")
+    if st.button("Got it, I'll behave 😇", key="dismiss_alerts"):
+        dismiss_alerts()
+        st.rerun()
+
+# Unusual spends flagged at write time (form, uploads, recurring)
+anomaly_state = load_anomaly_state()
+if anomaly_state and anomaly_state.get("recent"):
+    st.markdown("### 🚨 Wait, What Was That? 🤨")
+    st.dataframe(pd.DataFrame(anomaly_state["recent"]).iloc[::-1], hide_index=True, use_container_width=True)
+    if st.button("Yeah yeah, I know 🙈", key="clear_anomalies"):
+        anomaly_state["recent"] = []
+        save_anomaly_state(anomaly_state)
+        st.rerun()
+
 # Forecasting
 st.markdown("### 🔮 Crystal Ball Says... 💫")
-fc = forecast_month(expenses, year, month, threshold_days=10)
+ledger_meta = load_ledger_meta()
+fc = cached_forecast(str(DATA_DIR.resolve()), ledger_meta["generation"], ledger_meta.get("revision"),
+                     ledger_meta["rows"], ledger_meta["csv_bytes"], year, month, threshold_days=10)
 if fc.get("status") in ("no_data","not_enough_data"):
     st.info("Not enough data for a reliable forecast yet. Keep logging—I'll get smarter! 🧠✨")
 else:
@@ -800,37 +2785,95 @@ if income>0:
 else:
     st.info("Set monthly income in settings to enable savings predictions.")
 
+# What-if scenarios (Monte Carlo over the rest of the month)
+st.markdown("### 🎲 What If...? 🤔")
+with st.expander("Play with scenarios", expanded=False):
+    next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+    which = st.radio("Simulate", ["This month", "Next month"], horizontal=True)
+    sim_year, sim_month = (year, month) if which == "This month" else (next_year, next_month)
+    wc1, wc2 = st.columns(2)
+    extra_cat = wc1.selectbox("Extra monthly cost for", CATEGORIES, index=CATEGORIES.index("Rent"))
+    extra_amt = wc2.number_input("Extra cost (₹, e.g. a rent increase)", min_value=0.0, step=500.0, value=0.0)
+    cancel = st.multiselect("Cancel these recurring payments",
+                            recurring["Name"].tolist() if not recurring.empty else [])
+    cut_cats = st.multiselect("Cut spending on", CATEGORIES)
+    cut_pct = st.slider("...by (%)", 0, 100, 20, step=5, disabled=not cut_cats)
+    scenario = {"cuts": {c: cut_pct for c in cut_cats}, "extra": {extra_cat: extra_amt} if extra_amt else {},
+                "cancel": cancel}
+    sim_key = (str(DATA_DIR.resolve()), ledger_meta["generation"], ledger_meta.get("revision"), ledger_meta["rows"],
+               ledger_meta["csv_bytes"], RECURRING_FILE.stat().st_mtime_ns, sim_year, sim_month)
+    money = (settings.get("monthly_budget"), settings.get("monthly_income"), settings.get("savings_goal"))
+    baseline = cached_scenario(*sim_key, {}, *money)
+    sim = cached_scenario(*sim_key, scenario, *money)
+    sc1, sc2, sc3 = st.columns(3)
+    sc1.metric("Likely total (median)", f"₹{sim['p50']:.0f}", delta=f"₹{sim['p50'] - baseline['p50']:+.0f}",
+               delta_color="inverse")
+    sc1.caption(f"90% of paths land between ₹{sim['p5']:.0f} and ₹{sim['p95']:.0f}")
+    for col, key, label in ((sc2, "p_over_budget", "Chance of blowing the budget"),
+                            (sc3, "p_miss_savings", "Chance of missing savings goal")):
+        if sim[key] is None:
+            col.metric(label, "—")
+            col.caption("Set it in the sidebar to see this.")
+        else:
+            col.metric(label, f"{sim[key] * 100:.0f}%", delta=f"{(sim[key] - baseline[key]) * 100:+.0f} pts",
+                       delta_color="inverse")
+    fig_sim = px.histogram(x=sim["totals"], nbins=60, labels={"x": "Month total (₹)"},
+                           title=f"{SIM_PATHS} simulated {calendar.month_name[sim_month]}s")
+    if settings.get("monthly_budget"):
+        fig_sim.add_vline(x=float(settings["monthly_budget"]), line_dash="dash", annotation_text="budget")
+    st.plotly_chart(fig_sim, use_container_width=True)
+
 # Delete/Edit functionality
 st.markdown("### 🗑️ Fix My Oops Moments")
 
-tab1, tab2 = st.tabs(["Delete Expenses", "Delete Recurring"])
+tab1, tab2, tab3 = st.tabs(["Manage Expenses", "Delete Recurring", "🔎 Search"])
 
 with tab1:
     st.markdown("#### Recent Expenses")
-    current_expenses = load_expenses()
-    if not current_expenses.empty:
+    if load_ledger_meta()["rows"] > 0:
         # 🔥 Add Delete All button at the top
         if st.button("🚨 Delete ALL Expenses", type="primary"):
-            current_expenses = pd.DataFrame(columns=current_expenses.columns)  # clear dataframe
-            save_expenses(current_expenses)  # overwrite with empty
+            save_expenses(pd.DataFrame(columns=EXPENSE_COLUMNS))  # overwrite with empty
+            st.session_state["expense_cursors"] = [None]
             st.success("All expenses deleted!")
             st.rerun()
 
-        # Show last 15 expenses
-        recent_expenses = current_expenses.tail(15).iloc[::-1]  # Reverse to show newest first
-        
-        for idx, row in recent_expenses.iterrows():
-            col1, col2 = st.columns([5, 1])
-            with col1:
-                st.write(
-                    f"**{row['Date']}** | {row['Category']} | ₹{float(row['Amount']):.2f} "
-                    f"| {row['PaymentType']} | {row['Notes']}"
-                )
-            with col2:
-                if st.button("🗑️", key=f"del_exp_{idx}", help="Delete this expense"):
-                    delete_expense_by_index(current_expenses, idx)
-                    st.success("Deleted!")
-                    st.rerun()
+        # cursor stack: [None, cursor after page 1, cursor after page 2, ...]
+        cursors = st.session_state.setdefault("expense_cursors", [None])
+        page_rows, next_cursor = expense_page(cursors[-1])
+        page_rows.insert(1, "Delete", False)
+        with st.form("expense_page_form"):
+            edited = st.data_editor(
+                page_rows, hide_index=True, use_container_width=True, disabled=["Id", "CreatedAt"],
+                column_config={
+                    "Delete": st.column_config.CheckboxColumn("🗑️", help="Tick to delete"),
+                    "Date": st.column_config.DateColumn("Date", required=True),
+                    "Amount": st.column_config.NumberColumn("Amount (₹)", min_value=0.0, format="%.2f", required=True),
+                    # imported rows can carry labels outside the built-in lists; keep those selectable
+                    "Category": st.column_config.SelectboxColumn(
+                        "Category", options=CATEGORIES + sorted(set(page_rows["Category"].dropna().astype(str)) - set(CATEGORIES)),
+                        required=True),
+                    "PaymentType": st.column_config.SelectboxColumn(
+                        "PaymentType", options=PAYMENT_TYPES + sorted(set(page_rows["PaymentType"].dropna().astype(str)) - set(PAYMENT_TYPES)),
+                        required=True),
+                },
+                key=f"expense_editor_{len(cursors)}",
+            )
+            if st.form_submit_button("💾 Save edits & delete ticked"):
+                to_delete = edited.loc[edited["Delete"], "Id"].tolist()
+                changes = _changed_rows(page_rows, edited[~edited["Delete"]], EDITABLE_EXPENSE_COLUMNS)
+                n_edit = update_expenses(changes) if not changes.empty else 0
+                n_del = delete_expenses_by_id(to_delete) if to_delete else 0
+                st.success(f"Updated {n_edit}, deleted {n_del}!")
+                st.rerun()
+        nav1, nav2 = st.columns(2)
+        if nav1.button("⬅️ Newer", disabled=len(cursors) == 1, key="expense_prev"):
+            cursors.pop()
+            st.rerun()
+        if nav2.button("Older ➡️", disabled=next_cursor is None, key="expense_next"):
+            cursors.append(next_cursor)
+            st.rerun()
+        st.caption(f"Page {len(cursors)}")
     else:
         st.info("No expenses to delete")
 
@@ -846,21 +2889,86 @@ with tab2:
             st.success("All recurring payments deleted!")
             st.rerun()
 
-        for idx, row in current_recurring.iterrows():
-            col1, col2 = st.columns([5, 1])
-            with col1:
-                st.write(
-                    f"**{row['Name']}** | {row['Category']} | ₹{float(row['Amount']):.2f} "
-                    f"| {row['Frequency']} | Day {row['DayOfMonth']}"
-                )
-            with col2:
-                if st.button("🗑️", key=f"del_rec_{idx}", help="Delete this recurring payment"):
-                    delete_recurring_by_index(current_recurring, idx)
-                    st.success("Deleted!")
-                    st.rerun()
+        n_pages = -(-len(current_recurring) // MANAGER_PAGE_SIZE)
+        rec_page_no = min(st.session_state.get("recurring_page", 0), n_pages - 1)
+        rec_page = recurring_page(current_recurring, rec_page_no)
+        rec_view = rec_page.copy()
+        rec_view.insert(0, "Delete", False)
+        with st.form("recurring_page_form"):
+            rec_edited = st.data_editor(
+                rec_view, hide_index=True, use_container_width=True, disabled=["LastApplied"],
+                column_config={
+                    "Delete": st.column_config.CheckboxColumn("🗑️", help="Tick to delete"),
+                    "Category": st.column_config.SelectboxColumn("Category", options=CATEGORIES, required=True),
+                    "Amount": st.column_config.NumberColumn("Amount (₹)", min_value=0.0, format="%.2f", required=True),
+                    "Frequency": st.column_config.SelectboxColumn("Frequency", options=["Monthly", "Weekly"], required=True),
+                    "StartDate": st.column_config.DateColumn("StartDate", required=True),
+                    "DayOfMonth": st.column_config.NumberColumn("DayOfMonth", min_value=1, max_value=28, step=1,
+                                                                required=True),
+                },
+                key=f"recurring_editor_{rec_page_no}",
+            )
+            if st.form_submit_button("💾 Save edits & delete ticked"):
+                rec_edited.index = rec_page.index
+                keep = rec_edited[~rec_edited["Delete"]].drop(columns="Delete")
+                current_recurring.loc[keep.index, keep.columns] = keep
+                current_recurring = current_recurring.drop(rec_edited.index[rec_edited["Delete"]])
+                save_recurring(current_recurring.reset_index(drop=True))
+                st.success("Recurring payments updated!")
+                st.rerun()
+        nav1, nav2 = st.columns(2)
+        if nav1.button("⬅️ Previous", disabled=rec_page_no == 0, key="recurring_prev"):
+            st.session_state["recurring_page"] = rec_page_no - 1
+            st.rerun()
+        if nav2.button("Next ➡️", disabled=rec_page_no + 1 >= n_pages, key="recurring_next"):
+            st.session_state["recurring_page"] = rec_page_no + 1
+            st.rerun()
+        st.caption(f"Page {rec_page_no + 1} of {n_pages}")
     else:
         st.info("No recurring payments to delete")
 
+with tab3:
+    st.markdown("#### Where did my money go? 🕵️")
+    with st.form("search_form"):
+        q = st.text_input("Search notes, categories, recurring names (e.g. 'swig')")
+        srange = st.date_input("Date range (optional)", value=(), key="search_range")
+        a1, a2 = st.columns(2)
+        smin = a1.number_input("Min amount (₹)", min_value=0.0, value=0.0, step=100.0)
+        smax = a2.number_input("Max amount (₹, 0 = no limit)", min_value=0.0, value=0.0, step=100.0)
+        scats = st.multiselect("Categories (empty = all)", CATEGORIES, key="search_cats")
+        if st.form_submit_button("Search"):
+            st.session_state["search_params"] = {
+                "query": q,
+                "start": srange[0] if len(srange) > 0 else None,
+                "end": srange[1] if len(srange) > 1 else (srange[0] if len(srange) > 0 else None),
+                "min_amount": smin if smin > 0 else None,
+                "max_amount": smax if smax > 0 else None,
+                "categories": scats,
+            }
+            st.session_state["search_page"] = 0
+    params = st.session_state.get("search_params")
+    if params is not None:
+        page = st.session_state.get("search_page", 0)
+        res = search_expenses(page=page, **params)
+        st.caption(f"{res['total']} matches · page {page + 1} of {max(res['pages'], 1)}")
+        st.dataframe(res["rows"], hide_index=True, use_container_width=True)
+        nav1, nav2 = st.columns(2)
+        if nav1.button("⬅️ Newer", disabled=page == 0, key="search_prev"):
+            st.session_state["search_page"] = page - 1
+            st.rerun()
+        if nav2.button("Older ➡️", disabled=page + 1 >= res["pages"], key="search_next"):
+            st.session_state["search_page"] = page + 1
+            st.rerun()
+        del_ids = st.multiselect("Delete these expenses (by ID)", res["rows"]["Id"].tolist(), key="search_delete")
+        if del_ids and st.button("🗑️ Delete selected", key="search_delete_btn"):
+            removed = delete_expenses_by_id(del_ids)
+            st.success(f"Deleted {removed} expense(s)!")
+            st.rerun()
+        rules = search_recurring(params["query"]) if params["query"].strip() else None
+        if rules is not None and not rules.empty:
+            st.markdown("##### Matching recurring rules")
+            st.dataframe(rules, hide_index=True, use_container_width=True)
+
 
 
 # Recurring list
@@ -868,22 +2976,37 @@ st.markdown("### 🔄 Your Money Subscriptions 📋")
 if recurring is None or recurring.empty:
     st.info("No recurring payments saved. Living life one expense at a time! 🎭")
 else:
-    st.dataframe(recurring)
+    monthly_rules = recurring[recurring["Frequency"] == "Monthly"]["Amount"].sum()
+    weekly_rules = recurring[recurring["Frequency"] == "Weekly"]["Amount"].sum()
+    st.write(f"**{len(recurring)}** recurring payments · about **₹{monthly_rules + weekly_rules * 52 / 12:.2f}** a month")
+    st.caption("Edit or delete them in the Delete Recurring tab above.")
 
 # Allow exporting filtered data
 st.markdown("### 📤📥 Data Magic Tricks ✨")
 if st.button("Download full expense CSV"):
-    csv = load_expenses().to_csv(index=False).encode('utf-8')
-    st.download_button("Download CSV", csv, file_name="expenses_full.csv", mime="text/csv")
+    discard_export(st.session_state.get("full_export"))
+    st.session_state["full_export"] = start_export("CSV")
+show_export_job("full_export", "expenses_full")
 
-uploaded = st.file_uploader("Upload CSV to append (must have same columns)", type=["csv"])
-if uploaded is not None:
+uploaded = st.file_uploader("Upload bank statements or expense CSVs (OFX/QFX, QIF, CSV — any bank layout)",
+                            type=["csv", "ofx", "qfx", "qif"], accept_multiple_files=True)
+if uploaded and st.button("📥 Import statements"):
     try:
-        newdf = pd.read_csv(uploaded, parse_dates=["Date"])
-        # sanitize & append
-        newdf["CreatedAt"] = datetime.now()
-        newdf.to_csv(EXPENSES_FILE, mode='a', header=False, index=False)
-        st.success("📂 File absorbed into the matrix! Data updated! 🤖")
+        results, report = ingest_statements([(f.name, f.getvalue()) for f in uploaded])
+        for r in results:
+            if r["error"]:
+                st.error(f"{r['name']}: {r['error']}")
+            else:
+                st.write(f"✅ {r['name']} ({r['format'].upper()}): {len(r['rows'])} expenses")
+                skipped = r["skipped"] or {}
+                if skipped.get("incoming"):
+                    st.caption(f"↩️ Skipped {skipped['incoming']} incoming (credit) rows in {r['name']}")
+                if skipped.get("bad_dates") or skipped.get("bad_amounts"):
+                    st.warning(f"⚠️ {r['name']}: dropped {skipped.get('bad_dates', 0)} rows with unreadable dates "
+                               f"and {skipped.get('bad_amounts', 0)} with unreadable amounts")
+        if report:
+            st.success("📂 File absorbed into the matrix! Data updated! 🤖")
+            show_append_report(report)
     except Exception as e:
         st.error("Upload failed: " + str(e))
 
@@ -0,0 +1,286 @@
+# statement_parsers.py
+# Bank statement parsers (OFX/QFX, QIF, bank CSV exports) -> rows in the expense schema.
+# These are plain functions with no Streamlit state, so they can be called (and tested) outside the app.
+import hashlib
+import io
+import re
+
+import pandas as pd
+
+EXPENSE_COLUMNS = ["Date","Category","Amount","PaymentType","Notes","IsRecurring","CreatedAt"]
+
+# First matching category wins; anything else lands in "Other"
+CATEGORY_KEYWORDS = {
+    "Rent": ["rent", "landlord", "maintenance"],
+    "Subscriptions": ["netflix", "spotify", "prime", "hotstar", "youtube", "icloud", "subscription"],
+    "Utilities": ["electricity", "bescom", "water", "gas", "broadband", "airtel", "jio", "vodafone", "recharge", "bill"],
+    "Food": ["swiggy", "zomato", "restaurant", "cafe", "coffee", "pizza", "food", "blinkit", "zepto", "bigbasket", "grocery"],
+    "Travel": ["uber", "ola", "rapido", "irctc", "makemytrip", "indigo", "metro", "fuel", "petrol", "fastag"],
+    "Shopping": ["amazon", "flipkart", "myntra", "ajio", "nykaa", "mall", "store"],
+}
+
+_DATE_HEADERS = ["date", "txn date", "transaction date", "value date", "posting date", "tran date", "value dt"]
+_DESC_HEADERS = ["description", "narration", "details", "particulars", "remarks", "memo", "payee", "transaction details"]
+_AMOUNT_HEADERS = ["amount", "amt", "transaction amount", "amount (inr)", "amount(inr)"]
+_DEBIT_HEADERS = ["debit", "withdrawal", "withdrawal amt", "withdrawal amt.", "withdrawals", "debit amount", "dr", "paid out"]
+_CREDIT_HEADERS = ["credit", "deposit", "deposit amt", "deposit amt.", "deposits", "credit amount", "cr", "paid in"]
+_DRCR_HEADERS = ["dr/cr", "cr/dr", "type", "transaction type", "debit/credit"]
+
+# Tried in order, one vectorised pass per format; four-digit years before two-digit ones
+_DAYFIRST_FORMATS = ["%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y", "%d-%b-%Y", "%d %b %Y", "%d-%B-%Y", "%d %B %Y",
+                     "%d/%m/%y", "%d-%m-%y", "%d.%m.%y", "%d-%b-%y", "%d %b %y"]
+_MONTHFIRST_FORMATS = ["%m/%d/%Y", "%m-%d-%Y", "%b %d %Y", "%B %d %Y", "%m/%d/%y", "%m-%d-%y"]
+_ISO_FORMATS = ["%Y-%m-%d", "%Y/%m/%d", "%Y%m%d"]
+_TIME_SUFFIX = r"[ T]+\d{1,2}:\d{2}(:\d{2})?(\.\d+)?\s*([AaPp][Mm])?$"
+
+
+def detect_format(name, data):
+    lower = name.lower()
+    head = data[:4096].decode("utf-8", errors="ignore").upper()
+    if lower.endswith((".ofx", ".qfx")) or "<OFX>" in head or "OFXHEADER" in head:
+        return "ofx"
+    if lower.endswith(".qif") or head.lstrip().startswith("!TYPE"):
+        return "qif"
+    return "csv"
+
+
+def categorize(text):
+    """Keyword-based category for each description (vectorised over a Series)."""
+    text = text.fillna("").astype(str).str.lower()
+    out = pd.Series("Other", index=text.index)
+    unset = pd.Series(True, index=text.index)
+    for cat, words in CATEGORY_KEYWORDS.items():
+        hit = unset & text.str.contains("|".join(re.escape(w) for w in words), regex=True)
+        out[hit] = cat
+        unset &= ~hit
+    return out
+
+
+def parse_dates(values, dayfirst):
+    """
+    Parse each value against explicit formats (ISO first, then day- or month-first). A single
+    to_datetime call would infer one format from the first row and turn every other layout into NaT.
+    Values no format fits stay NaT, and the caller counts them.
+    """
+    text = (values.fillna("").astype(str).str.strip()
+            .str.replace(_TIME_SUFFIX, "", regex=True)
+            .str.replace(",", " ", regex=False).str.replace(r"\s+", " ", regex=True))
+    formats = _ISO_FORMATS + (_DAYFIRST_FORMATS + _MONTHFIRST_FORMATS if dayfirst
+                              else _MONTHFIRST_FORMATS + _DAYFIRST_FORMATS)
+    out = pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns]")
+    for fmt in formats:
+        missing = out.isna() & (text != "")
+        if not missing.any():
+            break
+        out[missing] = pd.to_datetime(text[missing], format=fmt, errors="coerce")
+    return out
+
+
+def _to_expenses(dates, amounts, notes, categories=None):
+    """
+    Keep money going out (negative amounts) and shape it like expenses.csv.
+    Returns (rows, skipped) where skipped counts the rows left out and why.
+    """
+    frame = pd.DataFrame({"Date": dates, "Amount": amounts, "Notes": notes.fillna("").astype(str).str.strip()})
+    dated = frame["Date"].notna()
+    skipped = {
+        "bad_dates": int((~dated).sum()),
+        "bad_amounts": int((dated & frame["Amount"].isna()).sum()),
+        "incoming": int((dated & (frame["Amount"] >= 0)).sum()),
+    }
+    spent = frame["Amount"] < 0
+    frame = frame[spent & dated].copy()
+    frame["Amount"] = frame["Amount"].abs().round(2)
+    if categories is not None:
+        known = categories[spent].where(categories[spent].isin(CATEGORY_KEYWORDS.keys()))
+        frame["Category"] = known.fillna(categorize(frame["Notes"]))
+    else:
+        frame["Category"] = categorize(frame["Notes"])
+    frame["PaymentType"] = frame["Notes"].str.contains("upi", case=False).map({True: "UPI", False: "Card"})
+    frame["IsRecurring"] = False
+    frame["CreatedAt"] = None
+    frame["Date"] = frame["Date"].dt.date
+    return frame.reindex(columns=EXPENSE_COLUMNS).reset_index(drop=True), skipped
+
+
+def _parse_amounts(values):
+    cleaned = values.astype(str).str.replace(r"[^\d.\-]", "", regex=True)
+    return pd.to_numeric(cleaned, errors="coerce")
+
+
+# ---------------------
+# OFX / QFX
+# ---------------------
+_OFX_TXN = re.compile(r"<STMTTRN>(.*?)(?=</STMTTRN>|<STMTTRN>|</BANKTRANLIST>|$)", re.S | re.I)
+
+
+def _ofx_field(block, tag):
+    m = re.search(rf"<{tag}>([^<\r\n]*)", block, re.I)
+    return m.group(1).strip() if m else None
+
+
+def parse_ofx(data):
+    text = data.decode("utf-8", errors="ignore")
+    blocks = _OFX_TXN.findall(text)
+    raw = pd.DataFrame({
+        "posted": [_ofx_field(b, "DTPOSTED") for b in blocks],
+        "amount": [_ofx_field(b, "TRNAMT") for b in blocks],
+        "name": [_ofx_field(b, "NAME") or "" for b in blocks],
+        "memo": [_ofx_field(b, "MEMO") or "" for b in blocks],
+    })
+    dates = pd.to_datetime(raw["posted"].str[:8], format="%Y%m%d", errors="coerce")
+    notes = (raw["name"] + " " + raw["memo"]).str.strip()
+    return _to_expenses(dates, _parse_amounts(raw["amount"]), notes)
+
+
+# ---------------------
+# QIF
+# ---------------------
+def parse_qif(data, dayfirst=None):
+    text = data.decode("utf-8", errors="ignore").replace("\r\n", "\n")
+    records = []
+    current = {}
+    for line in text.split("\n"):
+        if not line or line.startswith("!"):
+            continue
+        if line.startswith("^"):
+            if current:
+                records.append(current)
+            current = {}
+            continue
+        code, value = line[0], line[1:].strip()
+        if code in "DTPML":
+            current[code] = value
+    if current:
+        records.append(current)
+    raw = pd.DataFrame(records, columns=list("DTPML"))
+    # QIF dates look like 01/15/2024, 1/15'24, 1/ 5/24 or 15/01/2024 (Quicken defaults to month first)
+    raw_dates = raw["D"].fillna("").str.replace("'", "/", regex=False).str.replace(" ", "", regex=False)
+    if dayfirst is None:
+        dayfirst = _guess_dayfirst(raw_dates, default=False)
+    dates = parse_dates(raw_dates, dayfirst)
+    notes = (raw["P"].fillna("") + " " + raw["M"].fillna("")).str.strip()
+    category = raw["L"].fillna("").str.split(":").str[0].str.strip()
+    return _to_expenses(dates, _parse_amounts(raw["T"]), notes, category)
+
+
+# ---------------------
+# Bank CSV exports
+# ---------------------
+def _norm(col):
+    return re.sub(r"\s+", " ", str(col).strip().lower())
+
+
+def _pick(columns, candidates):
+    normed = {_norm(c): c for c in columns}
+    for cand in candidates:
+        if cand in normed:
+            return normed[cand]
+    for cand in candidates:
+        for n, c in normed.items():
+            # loose match, but never on combined columns like "Debit/Credit"
+            if len(cand) > 3 and cand in n and "/" not in n:
+                return c
+    return None
+
+
+def _find_header_row(lines):
+    """Banks like to put account details above the table; find the real header line."""
+    for i, line in enumerate(lines[:40]):
+        low = line.lower()
+        if any(h in low for h in ["date"]) and any(h in low for h in ["amount", "debit", "withdrawal", "credit", "deposit"]):
+            return i
+    return 0
+
+
+def header_fingerprint(header_line):
+    """Identifies a bank's export layout, used as the key for cached column profiles."""
+    normed = ",".join(_norm(c) for c in header_line.split(","))
+    return hashlib.sha1(normed.encode("utf-8")).hexdigest()[:16]
+
+
+def _guess_dayfirst(values, default=True):
+    sample = values.dropna().astype(str).head(200)
+    parts = sample.str.extract(r"^\s*(\d{1,2})[/\-.](\d{1,2})[/\-.]")
+    first = pd.to_numeric(parts[0], errors="coerce")
+    second = pd.to_numeric(parts[1], errors="coerce")
+    if (first > 12).any():
+        return True
+    if (second > 12).any():
+        return False
+    return default   # ambiguous; Indian banks use DD/MM
+
+
+def detect_csv_profile(df):
+    """Work out which columns hold date, description and money for an unknown bank layout."""
+    cols = list(df.columns)
+    if {"Date", "Category", "Amount"} <= set(cols):
+        return {"kind": "expenses"}
+    profile = {
+        "kind": "bank",
+        "date": _pick(cols, _DATE_HEADERS),
+        "description": _pick(cols, _DESC_HEADERS),
+        "amount": _pick(cols, _AMOUNT_HEADERS),
+        "debit": _pick(cols, _DEBIT_HEADERS),
+        "credit": _pick(cols, _CREDIT_HEADERS),
+        "drcr": _pick(cols, _DRCR_HEADERS),
+    }
+    if profile["date"] is None or (profile["amount"] is None and profile["debit"] is None):
+        raise ValueError("Couldn't find date/amount columns in " + ", ".join(map(str, cols)))
+    profile["dayfirst"] = _guess_dayfirst(df[profile["date"]])
+    return profile
+
+
+def parse_bank_csv(data, profiles=None):
+    """Parse a bank CSV. Returns (rows, skipped, fingerprint, profile) so the caller can cache new profiles."""
+    text = data.decode("utf-8-sig", errors="ignore")
+    lines = text.splitlines()
+    skip = _find_header_row(lines)
+    fingerprint = header_fingerprint(lines[skip]) if lines else ""
+    df = pd.read_csv(io.StringIO(text), skiprows=skip, skipinitialspace=True, dtype=str)
+    df = df.dropna(how="all")
+    profile = (profiles or {}).get(fingerprint) or detect_csv_profile(df)
+    if profile["kind"] == "expenses":
+        rows = df.reindex(columns=EXPENSE_COLUMNS)
+        dates = parse_dates(rows["Date"], dayfirst=False)
+        rows["Date"] = dates.dt.date
+        rows["Amount"] = _parse_amounts(rows["Amount"])
+        rows["IsRecurring"] = rows["IsRecurring"].fillna("").str.lower().isin(["true", "1", "yes"])
+        skipped = {"bad_dates": int(dates.isna().sum()),
+                   "bad_amounts": int((dates.notna() & rows["Amount"].isna()).sum()), "incoming": 0}
+        rows = rows[dates.notna() & rows["Amount"].notna()].reset_index(drop=True)
+        return rows, skipped, fingerprint, profile
+    dates = parse_dates(df[profile["date"]], profile["dayfirst"])
+    if profile.get("debit"):
+        debit = _parse_amounts(df[profile["debit"]]).fillna(0.0).abs()
+        credit = _parse_amounts(df[profile["credit"]]).fillna(0.0).abs() if profile.get("credit") else 0.0
+        amounts = credit - debit
+    else:
+        amounts = _parse_amounts(df[profile["amount"]])
+        if profile.get("drcr"):
+            is_debit = df[profile["drcr"]].astype(str).str.strip().str.lower().str.startswith(("dr", "debit"))
+            amounts = amounts.abs().where(~is_debit, -amounts.abs())
+    notes = df[profile["description"]] if profile.get("description") else pd.Series("", index=df.index)
+    rows, skipped = _to_expenses(dates, amounts, notes)
+    return rows, skipped, fingerprint, profile
+
+
+def parse_statement(name, data, profiles=None):
+    """
+    Parse one uploaded statement. Returns a dict with the normalised rows, counts of rows
+    skipped (incoming money, unreadable dates or amounts) and the CSV layout fingerprint/profile
+    (None for OFX/QIF). Errors are returned, not raised, so one bad file doesn't sink the rest of the batch.
+    """
+    result = {"name": name, "format": None, "rows": None, "skipped": None,
+              "fingerprint": None, "profile": None, "error": None}
+    try:
+        result["format"] = detect_format(name, data)
+        if result["format"] == "ofx":
+            result["rows"], result["skipped"] = parse_ofx(data)
+        elif result["format"] == "qif":
+            result["rows"], result["skipped"] = parse_qif(data)
+        else:
+            result["rows"], result["skipped"], result["fingerprint"], result["profile"] = parse_bank_csv(data, profiles)
+    except Exception as e:
+        result.update(format=None, rows=None, skipped=None, error=str(e))
+    return result
@@ -0,0 +1,51 @@
+# Shared fixtures. app.py is a Streamlit script, so importing it would run the UI;
+# tests load everything above the "UI / App" section instead, into a fresh module per
+# simulated session (Streamlit also runs the script in its own namespace per session).
+import logging
+import sys
+import threading
+import types
+from pathlib import Path
+
+import pytest
+
+APP_PATH = Path(__file__).resolve().parent.parent / "app.py"
+UI_MARKER = "# ---------------------\n# UI / App"
+
+sys.path.insert(0, str(APP_PATH.parent))   # statement_parsers
+logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+
+def _helpers_code():
+    src = APP_PATH.read_text(encoding="utf-8")
+    return compile(src[:src.index(UI_MARKER)], str(APP_PATH), "exec")
+
+
+@pytest.fixture
+def new_session(tmp_path, monkeypatch):
+    """Factory for app namespaces, all sharing one data/ tree under tmp_path."""
+    monkeypatch.chdir(tmp_path)
+    code = _helpers_code()
+
+    def make(data_dir=None):
+        app = types.ModuleType("app_session")
+        exec(code, app.__dict__)
+        if data_dir is not None:
+            app.set_data_dir(data_dir)
+            app.ensure_files()
+        return app
+
+    yield make
+    # background snapshot writers use relative paths; let them finish before the cwd is restored
+    for t in threading.enumerate():
+        if t is not threading.current_thread():
+            t.join(timeout=30)
+
+
+@pytest.fixture
+def app(new_session):
+    """A single session on the default user's ledger."""
+    session = new_session()
+    session.set_data_dir(session.user_data_dir(session.DEFAULT_USER))
+    session.ensure_files()
+    return session
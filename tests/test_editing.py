@@ -0,0 +1,106 @@
+# Inline edits from the paged manager (update_expenses).
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def _rows(n):
+    return pd.DataFrame({
+        "Date": ["2026-03-%02d" % (i % 28 + 1) for i in range(n)],
+        "Category": ["Food", "Travel"] * (n // 2),
+        "Amount": [100.0] * n,
+        "PaymentType": ["UPI"] * n,
+        "Notes": [f"lunch {i}" for i in range(n)],
+        "IsRecurring": [False] * n,
+        "CreatedAt": [None] * n,
+    })
+
+
+@pytest.fixture
+def ledger(app):
+    app.append_expense_rows(_rows(10))
+    app.write_snapshot(app.load_expense_frame(), app.load_ledger_meta())
+    return app
+
+
+def test_failed_save_leaves_cached_frame_untouched(ledger, monkeypatch):
+    edit = ledger.expense_page(None)[0].head(1).copy()
+    edit["Amount"] = 777.0
+
+    def boom(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(ledger, "rewrite_expense_rows", boom)
+    with pytest.raises(OSError):
+        ledger.update_expenses(edit)
+    assert (ledger.load_expense_frame()["Amount"] == 100.0).all()
+    assert (ledger.load_snapshot()["frame"]["Amount"] == 100.0).all()
+
+
+def test_edit_keeps_generation_and_patches_rollups(ledger):
+    meta_before = ledger.load_ledger_meta()
+    ledger.search_expenses("lunch")
+    page = ledger.expense_page(None)[0]
+    edit = page.head(2).copy()
+    edit.loc[edit.index[0], "Amount"] = 2500.0
+    edit.loc[edit.index[1], "Notes"] = "birthday cake"
+    edit.loc[edit.index[1], "Category"] = "Shopping"
+    assert ledger.update_expenses(edit) == 2
+
+    meta = ledger.load_ledger_meta()
+    assert meta["generation"] == meta_before["generation"]
+    assert meta["revision"] == meta_before["revision"] + 1
+
+    frame = ledger.load_expense_frame().set_index("Id")
+    assert frame.loc[edit["Id"].iloc[0], "Amount"] == 2500.0
+    assert frame.loc[edit["Id"].iloc[1], "Notes"] == "birthday cake"
+
+    # patched search index answers like a fresh one
+    assert ledger.search_expenses("birthday")["total"] == 1
+    assert ledger.search_expenses("lunch")["total"] == 9
+    fresh = ledger._build_search_index(*ledger.open_ledger())
+    patched = ledger.load_search_index()
+    assert patched["vocab"] == fresh["vocab"]
+    assert all((patched["postings"][t] == fresh["postings"][t]).all() for t in fresh["vocab"])
+
+    # cube and alert totals match a refold from the ledger
+    cols, meta = ledger.open_ledger()
+    total = int(np.asarray(cols["amount"]).sum())
+    assert ledger.load_cube()["periods"]["2026-03"]["total"] == total
+    assert ledger.load_cube()["periods"]["2026-03"]["category"]["Shopping"] == 10000
+    assert ledger.load_alert_state()["months"]["2026-03"]["total"] == total
+
+
+def test_stale_snapshot_is_not_served_after_edit(ledger, monkeypatch):
+    monkeypatch.setattr(ledger, "snapshot_in_background", lambda frame, meta: None)
+    edit = ledger.expense_page(None)[0].head(1).copy()
+    edit["Amount"] = 42.0
+    ledger.update_expenses(edit)
+    frame = ledger.load_expense_frame().set_index("Id")
+    assert frame.loc[edit["Id"].iloc[0], "Amount"] == 42.0
+
+
+def test_edit_rewrites_only_the_edited_rows(ledger):
+    csv_before = ledger.EXPENSES_FILE.read_bytes().splitlines()
+    edit = ledger.expense_page(None)[0].head(1).copy()
+    edit["Notes"] = "a much longer note than before"
+    edit["Amount"] = 1234.5
+    ledger.update_expenses(edit)
+
+    csv_after = ledger.EXPENSES_FILE.read_bytes().splitlines()
+    changed = [i for i, (a, b) in enumerate(zip(csv_before, csv_after)) if a != b]
+    assert len(csv_after) == len(csv_before) and len(changed) == 1
+    cols, meta = ledger.open_ledger()
+    assert meta["csv_bytes"] == ledger.EXPENSES_FILE.stat().st_size
+    assert (np.asarray(cols["offset"]) == ledger._scan_row_offsets()).all()
+    fresh = ledger.load_expense_frame()
+    assert fresh.set_index("Id").loc[edit["Id"].iloc[0], "Amount"] == 1234.5
+    assert fresh["Amount"].dtype == float
+
+
+def test_recurring_days_outside_the_month_are_clamped(app):
+    rules = pd.DataFrame([
+        {"Name": "Gym", "Category": "Other", "Amount": 500.0, "Frequency": "Monthly",
+         "StartDate": "2026-01-01", "DayOfMonth": day, "LastApplied": ""} for day in (0, 40)])
+    assert app.persist_recurring_for_month(rules, 2026, 2) == 2
+    assert list(app.load_expense_frame()["Date"].astype(str)) == ["2026-02-01", "2026-02-28"]
@@ -0,0 +1,51 @@
+# Exports: filters are pushed down to the ledger columns and the served file is not kept around.
+import io
+import os
+from datetime import date
+
+import pandas as pd
+
+
+def _rows():
+    return pd.DataFrame({
+        "Date": ["2026-01-05", "2026-01-20", "2026-02-03", "2026-02-28", "2026-03-01", "2026-03-15"],
+        "Category": ["Food", "Travel", "Food", "Rent", "Food", "Travel"],
+        "Amount": [10.0, 20.0, 30.0, 40.0, 50.0, 60.0],
+        "PaymentType": ["UPI"] * 6,
+        "Notes": ["a", "b, with comma", "c", "d", "e", "f"],
+        "IsRecurring": [False] * 6,
+        "CreatedAt": [None] * 6,
+    })
+
+
+def _export(app, tmp_path, **filters):
+    path = tmp_path / "out.csv"
+    rows = app.write_export(path, "CSV", **filters)
+    frame = pd.read_csv(path)
+    assert len(frame) == rows
+    return frame
+
+
+def test_filters_match_the_rows_they_should(app, tmp_path):
+    app.append_expense_rows(_rows())
+    frame = _export(app, tmp_path, start=date(2026, 1, 20), end=date(2026, 3, 1), categories=["Food", "Travel"])
+    assert list(frame["Notes"]) == ["b, with comma", "c", "e"]
+    assert list(_export(app, tmp_path)["Amount"]) == [10.0, 20.0, 30.0, 40.0, 50.0, 60.0]
+    assert _export(app, tmp_path, categories=["Shopping"]).empty
+
+
+def test_small_chunks_read_only_matching_lines(app):
+    app.append_expense_rows(_rows())
+    chunks = list(app.iter_expense_chunks(categories=["Rent", "Travel"], chunksize=2))
+    assert [list(c["Notes"]) for c in chunks] == [["b, with comma"], ["d"], ["f"]]
+
+
+def test_served_export_file_is_deleted(app):
+    app.append_expense_rows(_rows())
+    job = app.start_export("CSV")
+    assert job["done"] and os.path.exists(job["path"])
+
+    data = app.export_download(job)()
+
+    assert len(pd.read_csv(io.BytesIO(data))) == 6
+    assert job["served"] and not os.path.exists(job["path"])
@@ -0,0 +1,102 @@
+# Rewrites (delete, edit, "Delete ALL") while other sessions of the same user are reading the ledger.
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def _rows(n, tag="row"):
+    return pd.DataFrame({
+        "Date": ["2026-04-%02d" % (i % 28 + 1) for i in range(n)],
+        "Category": ["Food"] * n,
+        "Amount": [10.0] * n,
+        "PaymentType": ["UPI"] * n,
+        "Notes": [f"{tag} {i}" for i in range(n)],
+        "IsRecurring": [False] * n,
+        "CreatedAt": [None] * n,
+    })
+
+
+def test_rewrite_leaves_mapped_columns_of_other_sessions_intact(app, new_session):
+    app.append_expense_rows(_rows(1000))
+    reader = new_session(app.DATA_DIR)
+    cols, meta = reader.open_ledger()
+
+    app.save_expenses(pd.DataFrame(columns=app.EXPENSE_COLUMNS))   # "Delete ALL"
+
+    # the reader's columns still hold the revision it opened
+    assert int(np.asarray(cols["amount"]).sum()) == 1000 * 1000
+    assert len(cols["id"]) == meta["rows"] == 1000
+    cols, meta = reader.open_ledger()
+    assert meta["rows"] == 0 and len(cols["amount"]) == 0
+
+
+def test_old_revisions_are_dropped(app):
+    app.append_expense_rows(_rows(5))
+    app.save_expenses(app.load_expenses().head(3), ids=np.asarray(app.open_ledger()[0]["id"])[:3])
+    meta = app.load_ledger_meta()
+    dirs = [p.name for p in app.LEDGER_DIR.iterdir() if p.is_dir()]
+    assert dirs == [f"r{meta['revision']}"]
+    assert list(app.load_expense_frame()["Notes"]) == ["row 0", "row 1", "row 2"]
+
+
+def test_delete_does_not_lose_a_concurrent_append(app, new_session, monkeypatch):
+    app.append_expense_rows(_rows(5))
+    other = new_session(app.DATA_DIR)
+    load_expenses = app.load_expenses
+    appender = []
+
+    def load_then_race():
+        frame = load_expenses()
+        appender.append(threading.Thread(target=other.append_expense_rows, args=(_rows(1, "NEW"),)))
+        appender[0].start()
+        appender[0].join(timeout=0.5)   # blocks on the ledger lock while the delete holds it
+        return frame
+
+    monkeypatch.setattr(app, "load_expenses", load_then_race)
+    first_id = int(app.open_ledger()[0]["id"][0])
+    assert app.delete_expenses_by_id([first_id]) == 1
+    appender[0].join()
+
+    notes = list(app.load_expense_frame()["Notes"])
+    assert notes == ["row 1", "row 2", "row 3", "row 4", "NEW 0"]
+    assert app.load_ledger_meta()["rows"] == 5
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="fcntl file locks are POSIX only")
+def test_ledger_lock_waits_for_another_process(app):
+    lock_file = f"{app.DATA_DIR.resolve()}.lock"
+    holder = subprocess.Popen([sys.executable, "-c", (
+        "import fcntl, os, sys, time\n"
+        f"fd = os.open({lock_file!r}, os.O_RDWR | os.O_CREAT)\n"
+        "fcntl.flock(fd, fcntl.LOCK_EX)\n"
+        "print('held', flush=True)\n"
+        "time.sleep(1.0)\n")], stdout=subprocess.PIPE, text=True)
+    assert holder.stdout.readline().strip() == "held"
+    started = time.monotonic()
+    with app.ledger_lock():
+        waited = time.monotonic() - started
+    holder.wait()
+    assert waited > 0.5
+
+
+def test_background_snapshot_stays_with_its_user(new_session, monkeypatch):
+    admin = new_session()
+    first, second = (admin.create_account(name, "secret123") for name in ("first", "second"))
+    app = new_session(first)
+    app.append_expense_rows(_rows(3))
+    write_file = app._write_snapshot_file
+    monkeypatch.setattr(app, "_write_snapshot_file", lambda *args: (time.sleep(0.3), write_file(*args)))
+
+    app.save_expenses(app.load_expenses().head(2), ids=np.asarray(app.open_ledger()[0]["id"])[:2])
+    app.set_data_dir(second)   # e.g. the alert batch moving on to the next user
+    for t in threading.enumerate():
+        if t is not threading.current_thread():
+            t.join()
+
+    assert (first / "snapshot.pkl").exists()
+    assert not (second / "snapshot.pkl").exists()
@@ -0,0 +1,93 @@
+# Load test: many users, several sessions each, appending and reading at the same time.
+import threading
+import traceback
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+N_USERS = 8
+SESSIONS_PER_USER = 3
+BATCHES = 12
+BATCH_ROWS = 25
+
+
+def _batch(user, session, batch):
+    day = date(2026, 1, 1) + timedelta(days=batch)
+    return pd.DataFrame({
+        "Date": [day] * BATCH_ROWS,
+        "Category": ["Food", "Travel", "Shopping", "Rent", "Other"] * (BATCH_ROWS // 5),
+        "Amount": [float(i + 1) for i in range(BATCH_ROWS)],
+        "PaymentType": ["UPI"] * BATCH_ROWS,
+        "Notes": [f"owner{user} s{session} b{batch} r{i}" for i in range(BATCH_ROWS)],
+        "IsRecurring": [False] * BATCH_ROWS,
+        "CreatedAt": [None] * BATCH_ROWS,
+    })
+
+
+def test_concurrent_users_keep_isolated_consistent_ledgers(new_session):
+    admin = new_session()
+    users = [f"user{u}" for u in range(N_USERS)]
+    dirs = [admin.create_account(name, "secret123") for name in users]
+    sessions = [(u, s, new_session(dirs[u])) for u in range(N_USERS) for s in range(SESSIONS_PER_USER)]
+    errors = []
+    start = threading.Barrier(len(sessions))
+
+    def run(u, s, app):
+        try:
+            start.wait()
+            for b in range(BATCHES):
+                app.append_expense_rows(_batch(u, s, b))
+                summary = app.ledger_month_summary(2026, 1, today=date(2026, 1, 31))
+                assert summary["rows"] >= b + 1
+                hits = app.search_expenses(f"owner{u}")
+                assert hits["total"] >= (b + 1) * BATCH_ROWS
+        except Exception:   # surfaced below, threads can't fail the test themselves
+            errors.append((u, s, traceback.format_exc()))
+
+    threads = [threading.Thread(target=run, args=item) for item in sessions]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+
+    expected_rows = SESSIONS_PER_USER * BATCHES * BATCH_ROWS
+    per_batch = sum(range(1, BATCH_ROWS + 1)) * 100
+    for u, data_dir in enumerate(dirs):
+        app = new_session(data_dir)
+        cols, meta = app.open_ledger()
+        assert meta["rows"] == expected_rows
+        assert meta["csv_bytes"] == app.EXPENSES_FILE.stat().st_size
+        ids = np.asarray(cols["id"])
+        assert len(np.unique(ids)) == expected_rows and (np.diff(ids) > 0).all()
+        assert (np.asarray(cols["offset"]) == app._scan_row_offsets()).all()
+        assert int(np.asarray(cols["amount"]).sum()) == SESSIONS_PER_USER * BATCHES * per_batch
+
+        frame = app.load_expense_frame()
+        assert len(frame) == expected_rows
+        assert frame["Notes"].str.startswith(f"owner{u} ").all()
+        assert app.search_expenses(f"owner{u}")["total"] == expected_rows
+        for other in range(N_USERS):
+            if other != u:
+                assert app.search_expenses(f"owner{other}")["total"] == 0
+
+        cube = app.update_cube()
+        assert cube["periods"]["2026-01"]["total"] == SESSIONS_PER_USER * BATCHES * per_batch
+        alerts = app.load_alert_state()
+        assert alerts["months"]["2026-01"]["total"] == SESSIONS_PER_USER * BATCHES * per_batch
+
+
+def test_default_ledger_moves_into_its_user_directory(new_session):
+    app = new_session()
+    app.set_data_dir(app.ROOT_DATA_DIR)
+    app.ensure_files()
+    app.append_expense_rows(_batch(0, 0, 0))
+    app.write_json_atomic(app.ACCOUNTS_FILE, {app.DEFAULT_USER: {"salt": "00", "hash": "x", "dir": "."}})
+
+    data_dir = app.user_data_dir(app.DEFAULT_USER)
+    assert data_dir == app.USERS_DIR / app.DEFAULT_USER
+    assert not (app.ROOT_DATA_DIR / "expenses.csv").exists()
+    moved = new_session(data_dir)
+    assert moved.open_ledger()[1]["rows"] == BATCH_ROWS
+    assert moved.ledger_dirs() == [data_dir]
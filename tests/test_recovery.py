@@ -0,0 +1,114 @@
+# Crash recovery: recover_ledger() must finish or undo whatever a crashed append left behind.
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def _rows(n, tag):
+    return pd.DataFrame({
+        "Date": ["2026-02-%02d" % (i % 28 + 1) for i in range(n)],
+        "Category": ["Food"] * n,
+        "Amount": [10.0 + i for i in range(n)],
+        "PaymentType": ["UPI"] * n,
+        "Notes": [f"{tag} {i}" for i in range(n)],
+        "IsRecurring": [False] * n,
+        "CreatedAt": [None] * n,
+    })
+
+
+def _assert_consistent(app, expected_ids, expected_notes):
+    cols, meta = app.open_ledger()
+    assert meta["rows"] == len(expected_ids)
+    assert list(np.asarray(cols["id"])) == list(expected_ids)
+    assert meta["csv_bytes"] == app.EXPENSES_FILE.stat().st_size
+    assert (np.asarray(cols["offset"]) == app._scan_row_offsets()).all()
+    assert list(app.read_expense_rows(np.arange(meta["rows"]))["Notes"]) == expected_notes
+    assert list(app.load_expense_frame()["Notes"]) == expected_notes
+
+
+@pytest.fixture
+def committed(app):
+    """A ledger with 5 committed rows; returns their IDs."""
+    app.append_expense_rows(_rows(5, "kept"))
+    return list(np.asarray(app.open_ledger()[0]["id"]))
+
+
+def _crash_mid_append(app, rows, csv_tail):
+    """Do what append_expense_rows does up to the crash: journal the rows, then write part of the CSV."""
+    meta = app.sync_ledger()
+    ids = list(range(meta["next_id"], meta["next_id"] + len(rows)))
+    app.journal_append(app._clean_text_fields(rows), ids, meta["generation"])
+    data = rows.reindex(columns=app.EXPENSE_COLUMNS).to_csv(header=False, index=False).encode("utf-8")
+    with open(app.EXPENSES_FILE, "ab") as f:
+        f.write(data[:{"none": 0, "torn": len(data) // 2, "full": len(data)}[csv_tail]])
+    return ids
+
+
+def test_torn_journal_line_is_trimmed(app, committed):
+    with open(app.JOURNAL_FILE, "a") as f:
+        f.write('{"gen": 1, "Id": 99, "Date": "2026-02-')
+    app.recover_ledger()
+
+    assert app.JOURNAL_FILE.read_bytes().endswith(b"\n")
+    _assert_consistent(app, committed, [f"kept {i}" for i in range(5)])
+    app.append_expense_rows(_rows(2, "after"))
+    _assert_consistent(app, committed + [committed[-1] + 1, committed[-1] + 2],
+                       [f"kept {i}" for i in range(5)] + ["after 0", "after 1"])
+
+
+@pytest.mark.parametrize("csv_tail", ["none", "torn", "full"])
+def test_journaled_rows_are_committed_after_crash(app, committed, csv_tail):
+    csv_bytes_before = app.load_ledger_meta()["csv_bytes"]
+    pending = _crash_mid_append(app, _rows(3, "pending"), csv_tail)
+    if csv_tail != "none":
+        assert app.EXPENSES_FILE.stat().st_size > csv_bytes_before
+
+    app.recover_ledger()
+
+    _assert_consistent(app, committed + pending,
+                       [f"kept {i}" for i in range(5)] + [f"pending {i}" for i in range(3)])
+    assert app.load_ledger_meta()["next_id"] == pending[-1] + 1
+    # rollups saw the recovered rows exactly once
+    assert app.update_cube()["periods"]["2026-02"]["count"] == 8
+    assert app.load_alert_state()["months"]["2026-02"]["total"] == int(
+        (_rows(5, "").Amount.sum() + _rows(3, "").Amount.sum()) * 100)
+
+
+def test_recovery_is_idempotent(app, committed):
+    pending = _crash_mid_append(app, _rows(2, "pending"), "torn")
+    app.recover_ledger()
+    app.recover_ledger()
+    _assert_consistent(app, committed + pending,
+                       [f"kept {i}" for i in range(5)] + ["pending 0", "pending 1"])
+
+
+def _crash(*args, **kwargs):
+    raise OSError("power cut")
+
+
+def test_crash_while_writing_a_rewrite_keeps_the_old_history(app, committed, monkeypatch):
+    generation = app.load_ledger_meta()["generation"]
+    write_lines = app._write_expense_lines
+
+    def torn_write(df, f, start_offset):
+        write_lines(df.head(len(df) // 2), f, start_offset)
+        _crash()
+
+    with monkeypatch.context() as m, pytest.raises(OSError):
+        m.setattr(app, "_write_expense_lines", torn_write)
+        app.delete_expenses_by_id(committed[:1])
+    app.recover_ledger()
+
+    assert not app._expenses_tmp_file().exists()
+    assert app.load_ledger_meta()["generation"] == generation
+    _assert_consistent(app, committed, [f"kept {i}" for i in range(5)])
+
+
+def test_crash_after_the_rewrite_is_swapped_in(app, committed, monkeypatch):
+    with monkeypatch.context() as m, pytest.raises(OSError):
+        m.setattr(app, "rebuild_ledger", _crash)
+        app.delete_expenses_by_id(committed[:1])
+    app.recover_ledger()
+
+    cols, _ = app.open_ledger()
+    _assert_consistent(app, list(np.asarray(cols["id"])), [f"kept {i}" for i in range(1, 5)])
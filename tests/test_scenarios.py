@@ -0,0 +1,55 @@
+# What-if simulation: recurring charges are counted once, at their monthly cost, outside the day-to-day trend.
+import calendar
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def _rules(**overrides):
+    rule = {"Name": "Rent", "Category": "Rent", "Amount": 15000.0, "Frequency": "Monthly",
+            "StartDate": "2025-01-01", "DayOfMonth": 1, "LastApplied": ""}
+    rule.update(overrides)
+    return pd.DataFrame([rule])
+
+
+def test_recurring_total_counts_weekly_rules_per_month(app):
+    rules = pd.concat([_rules(), _rules(Name="Gym", Amount=500.0, Frequency="Weekly")], ignore_index=True)
+    assert app.scenario_recurring_total(rules, {}) == pytest.approx(15000 + 500 * 52 / 12)
+    assert app.scenario_recurring_total(rules, {"cancel": ["Rent"], "extra": {"Food": 100}}) == pytest.approx(
+        500 * 52 / 12 + 100)
+
+
+def test_recurring_total_skips_rules_already_logged_this_month(app):
+    rules = pd.concat([_rules(LastApplied="2026-03"),
+                       _rules(Name="Gym", Amount=500.0, Frequency="Weekly", LastApplied="2026-03")],
+                      ignore_index=True)
+    logged = {"Rent": 15000.0, "Gym": 500.0}
+    assert app.scenario_recurring_total(rules, {}, "2026-03", logged) == pytest.approx(500 * 52 / 12 - 500)
+    # applied in an earlier month: this month's charge is still to come
+    assert app.scenario_recurring_total(rules, {}, "2026-04", logged) == pytest.approx(15000 + 500 * 52 / 12)
+
+
+def test_rent_on_the_first_does_not_flatten_the_simulation(app):
+    today = date.today()
+    days = [today - timedelta(days=i) for i in range(90)]
+    app.append_expense_rows(pd.DataFrame({
+        "Date": days, "Category": "Food", "Amount": [50.0 if d.toordinal() % 2 else 150.0 for d in days],
+        "PaymentType": "UPI", "Notes": "lunch", "IsRecurring": False, "CreatedAt": None,
+    }))
+    app.append_expense_rows(pd.DataFrame([{
+        "Date": today.replace(day=1), "Category": "Rent", "Amount": 15000.0, "PaymentType": "Recurring",
+        "Notes": "Recurring: Rent", "IsRecurring": True, "CreatedAt": None,
+    }]))
+    rules = _rules(LastApplied=f"{today.year}-{today.month:02d}")
+
+    fc = app.forecast_month(None, today.year, today.month, include_recurring=False)
+    sim = app.simulate_month(today.year, today.month, forecast=fc, rec_df=rules, today=today)
+
+    days_in_month = calendar.monthrange(today.year, today.month)[1]
+    assert sim["recurring"] == 0.0
+    assert sim["p50"] == pytest.approx(15000 + 100 * days_in_month, rel=0.03)
+    if sim["days_left"] > 1:
+        assert sim["p5"] < sim["p95"]
+    assert np.isfinite(sim["totals"]).all()
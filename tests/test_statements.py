@@ -0,0 +1,40 @@
+# Statement parsing: every row either becomes an expense or is counted as skipped, never lost silently.
+from datetime import date
+
+import statement_parsers
+
+
+def test_qif_mixed_date_layouts_all_parse():
+    data = (b"!Type:Bank\n"
+            b"D1/15/2024\nT-250.00\nPSwiggy\n^\n"
+            b"D1/16'24\nT-120.00\nPAmazon\n^\n"
+            b"D1/ 5/24\nT-80.00\nPUber\n^\n"
+            b"D1/20/2024\nT5000.00\nPSalary\n^\n")
+    result = statement_parsers.parse_statement("bank.qif", data)
+
+    assert result["error"] is None and result["format"] == "qif"
+    assert list(result["rows"]["Date"]) == [date(2024, 1, 15), date(2024, 1, 16), date(2024, 1, 5)]
+    assert list(result["rows"]["Amount"]) == [250.0, 120.0, 80.0]
+    assert result["skipped"] == {"bad_dates": 0, "bad_amounts": 0, "incoming": 1}
+
+
+def test_qif_unreadable_date_is_counted():
+    data = b"D1/15/2024\nT-250.00\nPSwiggy\n^\nDsometime\nT-10.00\nPTea\n^\n"
+    result = statement_parsers.parse_statement("bank.qif", data)
+
+    assert len(result["rows"]) == 1
+    assert result["skipped"]["bad_dates"] == 1
+
+
+def test_bank_csv_mixed_date_layouts():
+    data = ("Txn Date,Description,Debit,Credit,Balance\n"
+            "15/01/2026,Swiggy order,250.00,,1000\n"
+            "16-Jan-2026,Amazon,120.00,,880\n"
+            "17/01/2026 18:42:10,Uber,80.00,,800\n"
+            "18/01/2026,Salary,,5000.00,5800\n"
+            "not a date,Tea,10.00,,5790\n").encode()
+    result = statement_parsers.parse_statement("hdfc.csv", data)
+
+    assert result["error"] is None
+    assert list(result["rows"]["Date"]) == [date(2026, 1, 15), date(2026, 1, 16), date(2026, 1, 17)]
+    assert result["skipped"] == {"bad_dates": 1, "bad_amounts": 0, "incoming": 1}